@@ -0,0 +1,86 @@
+"""create product ratings table
+
+Revision ID: 5c1d7e2a9f3b
+Revises: df868f43536b
+Create Date: 2026-10-18 10:12:41.305118
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c1d7e2a9f3b"
+down_revision: Union[str, Sequence[str], None] = "df868f43536b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "product_ratings",
+        sa.Column(
+            "product_id",
+            sa.Integer,
+            sa.ForeignKey("products.id", ondelete="CASCADE"),
+            primary_key=True,
+            nullable=False,
+        ),
+        sa.Column("rating_sum", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column(
+            "reviews_count", sa.Integer, nullable=False, server_default=sa.text("0")
+        ),
+        sa.Column(
+            "average_rating", sa.Float, nullable=False, server_default=sa.text("0")
+        ),
+        sa.Column("rating_1", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("rating_2", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("rating_3", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("rating_4", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("rating_5", sa.Integer, nullable=False, server_default=sa.text("0")),
+    )
+
+    # Заполняем итоги по уже существующим отзывам, строка заводится для каждого товара
+    op.execute(
+        """
+        INSERT INTO product_ratings (
+            product_id, rating_sum, reviews_count, average_rating,
+            rating_1, rating_2, rating_3, rating_4, rating_5
+        )
+        SELECT
+            p.id,
+            COALESCE(SUM(r.rating), 0),
+            COUNT(r.id),
+            COALESCE(AVG(r.rating), 0),
+            COUNT(r.id) FILTER (WHERE r.rating = 1),
+            COUNT(r.id) FILTER (WHERE r.rating = 2),
+            COUNT(r.id) FILTER (WHERE r.rating = 3),
+            COUNT(r.id) FILTER (WHERE r.rating = 4),
+            COUNT(r.id) FILTER (WHERE r.rating = 5)
+        FROM products p
+        LEFT JOIN product_reviews r ON r.product_id = p.id
+        GROUP BY p.id
+        """
+    )
+
+    op.create_index(
+        "ix_product_ratings_average_rating_id",
+        "product_ratings",
+        ["average_rating", "product_id"],
+    )
+    op.create_index(
+        "ix_product_ratings_reviews_count_id",
+        "product_ratings",
+        ["reviews_count", "product_id"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_product_ratings_reviews_count_id", table_name="product_ratings")
+    op.drop_index("ix_product_ratings_average_rating_id", table_name="product_ratings")
+    op.drop_table("product_ratings")
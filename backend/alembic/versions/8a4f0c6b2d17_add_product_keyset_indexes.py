@@ -0,0 +1,36 @@
+"""add product keyset indexes
+
+Revision ID: 8a4f0c6b2d17
+Revises: 5c1d7e2a9f3b
+Create Date: 2026-10-18 11:03:27.184552
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8a4f0c6b2d17"
+down_revision: Union[str, Sequence[str], None] = "5c1d7e2a9f3b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_products_price_id", "products", ["price", "id"])
+    op.create_index("ix_products_name_id", "products", ["name", "id"])
+    # quantity допускает NULL, каталог сортирует по COALESCE(quantity, 0)
+    op.create_index(
+        "ix_products_quantity_id", "products", [sa.text("COALESCE(quantity, 0)"), "id"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_products_quantity_id", table_name="products")
+    op.drop_index("ix_products_name_id", table_name="products")
+    op.drop_index("ix_products_price_id", table_name="products")
@@ -0,0 +1,55 @@
+"""create idempotency keys table
+
+Revision ID: a1d5f7c3e9b2
+Revises: f2c8d6a0b4e3
+Create Date: 2026-10-18 16:11:52.093615
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a1d5f7c3e9b2"
+down_revision: Union[str, Sequence[str], None] = "f2c8d6a0b4e3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "idempotency_keys",
+        sa.Column(
+            "user_id",
+            sa.Integer,
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            primary_key=True,
+            nullable=False,
+        ),
+        sa.Column("scope", sa.String, primary_key=True, nullable=False),
+        sa.Column("key", sa.String, primary_key=True, nullable=False),
+        sa.Column("request_hash", sa.String, nullable=False),
+        sa.Column("status_code", sa.Integer, nullable=True),
+        sa.Column("response", postgresql.JSONB, nullable=True),
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        sa.Column("expires_at", sa.TIMESTAMP(timezone=True), nullable=False),
+    )
+    op.create_index(
+        "ix_idempotency_keys_expires_at", "idempotency_keys", ["expires_at"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_idempotency_keys_expires_at", table_name="idempotency_keys")
+    op.drop_table("idempotency_keys")
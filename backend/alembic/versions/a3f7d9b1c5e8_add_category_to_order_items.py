@@ -0,0 +1,39 @@
+"""add category to order items
+
+Revision ID: a3f7d9b1c5e8
+Revises: f6c0d2e8a4b7
+Create Date: 2026-10-18 20:12:41.583204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a3f7d9b1c5e8"
+down_revision: Union[str, Sequence[str], None] = "f6c0d2e8a4b7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("order_items", sa.Column("category", sa.String(), nullable=True))
+    # Для старых позиций категория на момент покупки неизвестна, берем текущую категорию товара
+    op.execute(
+        """
+        UPDATE order_items oi
+        SET category = p.category
+        FROM products p
+        WHERE p.id = oi.product_id
+        """
+    )
+    op.alter_column("order_items", "category", nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("order_items", "category")
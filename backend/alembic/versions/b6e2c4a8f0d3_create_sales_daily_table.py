@@ -0,0 +1,53 @@
+"""create sales daily table
+
+Revision ID: b6e2c4a8f0d3
+Revises: a1d5f7c3e9b2
+Create Date: 2026-10-18 16:48:30.615827
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b6e2c4a8f0d3"
+down_revision: Union[str, Sequence[str], None] = "a1d5f7c3e9b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "sales_daily",
+        sa.Column("day", sa.Date, primary_key=True, nullable=False),
+        sa.Column("category", sa.String, primary_key=True, nullable=False),
+        sa.Column("product_id", sa.Integer, primary_key=True, nullable=False),
+        sa.Column("units", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("revenue", sa.Float, nullable=False, server_default=sa.text("0")),
+    )
+
+    op.execute(
+        """
+        INSERT INTO sales_daily (day, category, product_id, units, revenue)
+        SELECT
+            (o.created_at AT TIME ZONE 'UTC')::date,
+            p.category,
+            oi.product_id,
+            sum(oi.quantity),
+            sum(oi.quantity * oi.price)
+        FROM order_items oi
+        JOIN orders o ON o.id = oi.order_id
+        JOIN products p ON p.id = oi.product_id
+        WHERE o.status IS DISTINCT FROM 'отменен'
+        GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("sales_daily")
@@ -0,0 +1,60 @@
+"""add product search indexes
+
+Revision ID: c3e9a1d4b5f6
+Revises: 8a4f0c6b2d17
+Create Date: 2026-10-18 11:48:09.527301
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c3e9a1d4b5f6"
+down_revision: Union[str, Sequence[str], None] = "8a4f0c6b2d17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    op.create_index(
+        "ix_products_name_trgm",
+        "products",
+        ["name"],
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    )
+    op.create_index(
+        "ix_products_description_trgm",
+        "products",
+        ["description"],
+        postgresql_using="gin",
+        postgresql_ops={"description": "gin_trgm_ops"},
+    )
+
+    # Выражение совпадает с product_search_vector() в app/routers/products.py
+    op.execute(
+        """
+        CREATE INDEX ix_products_search_vector ON products USING gin (
+            (
+                setweight(to_tsvector('russian'::regconfig, name), 'A')
+                || setweight(
+                    to_tsvector('russian'::regconfig, coalesce(description, '')), 'B'
+                )
+            )
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_products_search_vector", table_name="products")
+    op.drop_index("ix_products_description_trgm", table_name="products")
+    op.drop_index("ix_products_name_trgm", table_name="products")
@@ -0,0 +1,83 @@
+"""constrain and index order status
+
+Revision ID: c7f3a9e1b5d4
+Revises: b6e2c4a8f0d3
+Create Date: 2026-10-18 17:35:06.248190
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c7f3a9e1b5d4"
+down_revision: Union[str, Sequence[str], None] = "b6e2c4a8f0d3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Приводим накопленные значения к допустимому набору до создания ограничения
+    op.execute("UPDATE orders SET status = lower(btrim(status)) WHERE status IS NOT NULL")
+    op.execute("UPDATE orders SET status = replace(status, 'ё', 'е') WHERE status LIKE '%ё%'")
+    # Неизвестные статусы не угадываем: их нужно разобрать вручную, иначе миграция остановится
+    unknown = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                """
+                SELECT status, count(*) FROM orders
+                WHERE status NOT IN ('в обработке', 'отправлен', 'доставлен', 'отменен')
+                GROUP BY status
+                ORDER BY status
+                """
+            )
+        )
+        .all()
+    )
+    if unknown:
+        listed = ", ".join(f"'{status}' ({count})" for status, count in unknown)
+        raise RuntimeError(
+            f"В orders есть статусы вне допустимого набора: {listed}. "
+            "Исправьте их вручную и повторите миграцию"
+        )
+    # Статус без значения - заказ, созданный до появления значения по умолчанию
+    op.execute("UPDATE orders SET status = 'в обработке' WHERE status IS NULL")
+
+    op.alter_column(
+        "orders",
+        "status",
+        existing_type=sa.String(),
+        nullable=False,
+        server_default=sa.text("'в обработке'"),
+    )
+    op.create_check_constraint(
+        "ck_orders_status",
+        "orders",
+        "status IN ('в обработке', 'отправлен', 'доставлен', 'отменен')",
+    )
+    op.create_index("ix_orders_status_created_at", "orders", ["status", "created_at"])
+    op.create_index(
+        "ix_orders_open_created_at",
+        "orders",
+        ["created_at", "id"],
+        postgresql_where=sa.text("status IN ('в обработке', 'отправлен')"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_orders_open_created_at", table_name="orders")
+    op.drop_index("ix_orders_status_created_at", table_name="orders")
+    op.drop_constraint("ck_orders_status", "orders", type_="check")
+    op.alter_column(
+        "orders",
+        "status",
+        existing_type=sa.String(),
+        nullable=True,
+        server_default=None,
+    )
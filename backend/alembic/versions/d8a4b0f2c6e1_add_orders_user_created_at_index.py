@@ -0,0 +1,34 @@
+"""add orders user created_at index
+
+Revision ID: d8a4b0f2c6e1
+Revises: c7f3a9e1b5d4
+Create Date: 2026-10-18 18:02:41.517304
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d8a4b0f2c6e1"
+down_revision: Union[str, Sequence[str], None] = "c7f3a9e1b5d4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Страница "Мои заказы" читается по индексу в нужном порядке, id делает ключ уникальным для курсора
+    op.create_index(
+        "ix_orders_user_id_created_at_id",
+        "orders",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_orders_user_id_created_at_id", table_name="orders")
@@ -0,0 +1,43 @@
+"""create category counts table
+
+Revision ID: e4a7b9c2d1f0
+Revises: c3e9a1d4b5f6
+Create Date: 2026-10-18 14:26:09.517340
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e4a7b9c2d1f0"
+down_revision: Union[str, Sequence[str], None] = "c3e9a1d4b5f6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "category_counts",
+        sa.Column("category", sa.String, primary_key=True, nullable=False),
+        sa.Column("total", sa.Integer, nullable=False, server_default=sa.text("0")),
+        sa.Column("in_stock", sa.Integer, nullable=False, server_default=sa.text("0")),
+    )
+
+    op.execute(
+        """
+        INSERT INTO category_counts (category, total, in_stock)
+        SELECT category, count(id), count(id) FILTER (WHERE quantity > 0)
+        FROM products
+        GROUP BY category
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("category_counts")
@@ -0,0 +1,36 @@
+"""add product reviews page index
+
+Revision ID: f2c8d6a0b4e3
+Revises: e4a7b9c2d1f0
+Create Date: 2026-10-18 15:02:44.871203
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f2c8d6a0b4e3"
+down_revision: Union[str, Sequence[str], None] = "e4a7b9c2d1f0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Порядок индекса совпадает с выдачей отзывов: страница читается без сортировки
+    op.create_index(
+        "ix_product_reviews_product_id_created_at_id",
+        "product_reviews",
+        ["product_id", sa.text("created_at DESC"), sa.text("id DESC")],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_product_reviews_product_id_created_at_id", table_name="product_reviews"
+    )
@@ -0,0 +1,68 @@
+"""add cart unique constraints
+
+Revision ID: f6c0d2e8a4b7
+Revises: e5b9c1d7f3a2
+Create Date: 2026-10-18 18:54:37.260815
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f6c0d2e8a4b7"
+down_revision: Union[str, Sequence[str], None] = "e5b9c1d7f3a2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Позиции из лишних корзин пользователя переносим в самую раннюю, затем удаляем лишние
+    op.execute(
+        """
+        UPDATE cart_items ci
+        SET cart_id = c.keep_id
+        FROM (
+            SELECT id, min(id) OVER (PARTITION BY user_id) AS keep_id FROM cart
+        ) c
+        WHERE ci.cart_id = c.id AND c.id <> c.keep_id
+        """
+    )
+    op.execute("DELETE FROM cart c USING cart k WHERE c.user_id = k.user_id AND c.id > k.id")
+
+    # Повторяющиеся строки одного товара в корзине схлопываем в первую с суммарным количеством
+    op.execute(
+        """
+        UPDATE cart_items ci
+        SET quantity = d.total
+        FROM (
+            SELECT min(id) AS keep_id, sum(quantity) AS total
+            FROM cart_items
+            GROUP BY cart_id, product_id
+            HAVING count(*) > 1
+        ) d
+        WHERE ci.id = d.keep_id
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM cart_items ci
+        USING cart_items k
+        WHERE ci.cart_id = k.cart_id AND ci.product_id = k.product_id AND ci.id > k.id
+        """
+    )
+
+    op.create_unique_constraint("uq_cart_user_id", "cart", ["user_id"])
+    op.create_unique_constraint(
+        "uq_cart_items_cart_id_product_id", "cart_items", ["cart_id", "product_id"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("uq_cart_items_cart_id_product_id", "cart_items", type_="unique")
+    op.drop_constraint("uq_cart_user_id", "cart", type_="unique")
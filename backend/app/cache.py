@@ -0,0 +1,173 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+from fastapi import Request, Response, status
+from .config import settings
+
+_MISSING = object()
+
+CATALOG_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+
+class TTLCache:
+    """
+    Ограниченный по размеру LRU-кэш, записи которого истекают через ttl секунд
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Растет при каждой инвалидации: ответ, прочитанный из БД до нее, не попадет в кэш
+        self.generation = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, generation: int | None = None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+product_list_cache = TTLCache(settings.cache_max_entries, settings.cache_ttl_seconds)
+product_cache = TTLCache(settings.cache_max_entries, settings.cache_ttl_seconds)
+categories_cache = TTLCache(1, settings.cache_ttl_seconds)
+reviews_cache = TTLCache(settings.cache_max_entries, settings.cache_ttl_seconds)
+facets_cache = TTLCache(settings.cache_max_entries, settings.facets_cache_ttl_seconds)
+
+CACHES = {
+    "product_list": product_list_cache,
+    "product": product_cache,
+    "categories": categories_cache,
+    "reviews": reviews_cache,
+    "facets": facets_cache,
+}
+
+
+class CatalogVersion:
+    """
+    Версия каталога для ETag: меняется при каждой записи товаров или отзывов в этом процессе.
+    Случайный префикс процесса не дает совпасть ETag после перезапуска
+    """
+
+    def __init__(self):
+        self._prefix = uuid4().hex
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self._value += 1
+
+    def __str__(self):
+        return f"{self._prefix}:{self._value}"
+
+
+catalog_version = CatalogVersion()
+
+
+def catalog_epoch() -> int:
+    # Записи других воркеров, реплик, CLI и прямого SQL счетчик процесса не видит, поэтому ETag
+    # дополнительно меняется раз в cache_ttl_seconds: устаревший 304 живет не дольше записей кэша
+    return int(time.time() // settings.cache_ttl_seconds)
+
+
+def catalog_etag(*parts) -> str:
+    raw = repr((str(catalog_version), catalog_epoch(), parts)).encode()
+    return f'"{hashlib.sha1(raw).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in {tag.strip() for tag in if_none_match.split(",")}
+
+
+def set_catalog_headers(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CATALOG_CACHE_CONTROL
+    response.headers["Vary"] = "Accept-Encoding"
+
+
+def not_modified(etag: str) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_catalog_headers(response, etag)
+    return response
+
+
+def invalidate_products(*product_ids: int):
+    """
+    Сбрасывает списки и категории, а из карточек только изменившиеся товары
+    """
+    catalog_version.bump()
+    product_list_cache.clear()
+    categories_cache.clear()
+    facets_cache.clear()
+    for product_id in product_ids:
+        product_cache.pop(product_id)
+
+
+def invalidate_reviews(*product_ids: int):
+    # Отзыв меняет рейтинг в списках и карточке, но не состав категорий
+    catalog_version.bump()
+    product_list_cache.clear()
+    facets_cache.clear()
+    for product_id in product_ids:
+        product_cache.pop(product_id)
+        reviews_cache.pop(product_id)
+
+
+def cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in CACHES.items()}
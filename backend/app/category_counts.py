@@ -0,0 +1,72 @@
+"""
+Проверка и пересборка таблицы category_counts:
+
+    python -m app.category_counts            # только сверка с products
+    python -m app.category_counts --rebuild  # пересчитать таблицу заново
+"""
+
+import argparse
+import sys
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from . import crud, database, models
+
+
+def find_mismatches(db: Session) -> list[dict]:
+    """
+    Сравнивает сохраненные счетчики с фактическими по products
+    """
+    actual = crud.category_counts_query().subquery()
+    stored = models.CategoryCount
+    rows = db.execute(
+        select(
+            func.coalesce(actual.c.category, stored.category).label("category"),
+            stored.total.label("stored_total"),
+            stored.in_stock.label("stored_in_stock"),
+            actual.c.total.label("actual_total"),
+            actual.c.in_stock.label("actual_in_stock"),
+        )
+        .select_from(actual)
+        .join(stored, stored.category == actual.c.category, full=True)
+        .where(
+            stored.total.is_distinct_from(actual.c.total)
+            | stored.in_stock.is_distinct_from(actual.c.in_stock)
+        )
+        .order_by("category")
+    )
+    return [dict(row._mapping) for row in rows]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Сверка и пересборка category_counts")
+    parser.add_argument(
+        "--rebuild", action="store_true", help="пересчитать таблицу по products"
+    )
+    args = parser.parse_args(argv)
+
+    db = database.SessionLocal()
+    try:
+        mismatches = find_mismatches(db)
+        for row in mismatches:
+            print(
+                f"{row['category']}: сохранено {row['stored_total']}/{row['stored_in_stock']}, "
+                f"фактически {row['actual_total']}/{row['actual_in_stock']}"
+            )
+
+        if args.rebuild:
+            crud.recount_categories(db)
+            db.commit()
+            print("Таблица category_counts пересчитана")
+            return 0
+
+        if mismatches:
+            print(f"Расхождений: {len(mismatches)}")
+            return 1
+        print("Расхождений нет")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
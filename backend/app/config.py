@@ -14,6 +14,15 @@ class Settings(BaseSettings):
     supabase_anon_key: str
     supabase_service_role_key: str
     supabase_bucket: str
+    cache_max_entries: int = 1024
+    cache_ttl_seconds: float = 60
+    facets_cache_ttl_seconds: float = 15
+    idempotency_ttl_seconds: int = 86400
+    outbox_worker_enabled: bool = False
+    outbox_handler_modules: list[str] = []
+    outbox_batch_size: int = 100
+    outbox_max_attempts: int = 10
+    outbox_poll_interval_seconds: float = 5
 
     class Config:
         env_file = ".env"
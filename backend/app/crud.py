@@ -1,3 +1,227 @@
+from sqlalchemy import Date, Float, case, cast, delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
-from . import models, schemas 
+from . import models, schemas
 
+RATING_STARS = range(1, 6)
+ORDER_CANCELLED = "отменен"
+# Ключи совпадают с models.ORDER_STATUSES, которые закреплены ограничением ck_orders_status
+ORDER_STATUS_TRANSITIONS = {
+    "в обработке": {"отправлен", ORDER_CANCELLED},
+    "отправлен": {"доставлен", ORDER_CANCELLED},
+    "доставлен": set(),
+    ORDER_CANCELLED: set(),
+}
+
+
+def status_change_allowed(current: str, new: str) -> bool:
+    return new in ORDER_STATUS_TRANSITIONS.get(current, ())
+
+
+def add_rating(db: Session, product_id: int, rating: int):
+    """
+    Учитывает новую оценку в сохраненных итогах product_ratings.
+    Коммит остается за вызывающим кодом, чтобы итоги менялись в одной транзакции с отзывом
+    """
+    star_column = f"rating_{rating}"
+    stats = models.ProductRating.__table__.c
+
+    stmt = insert(models.ProductRating).values(
+        product_id=product_id,
+        rating_sum=rating,
+        reviews_count=1,
+        average_rating=rating,
+        **{star_column: 1},
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[stats.product_id],
+        set_={
+            "rating_sum": stats.rating_sum + rating,
+            "reviews_count": stats.reviews_count + 1,
+            "average_rating": cast(stats.rating_sum + rating, Float)
+            / (stats.reviews_count + 1),
+            star_column: stats[star_column] + 1,
+        },
+    )
+    db.execute(stmt)
+
+
+def remove_user_ratings(db: Session, user_id: int) -> list[int]:
+    """
+    Вычитает оценки пользователя из итогов перед каскадным удалением его отзывов.
+    Возвращает id товаров, рейтинг которых изменился: их кэши сбрасывает вызывающий код после коммита
+    """
+    review = models.ProductReview
+    per_product = (
+        select(
+            review.product_id,
+            func.sum(review.rating).label("rating_sum"),
+            func.count(review.id).label("reviews_count"),
+            *[
+                func.count(review.id).filter(review.rating == star).label(f"rating_{star}")
+                for star in RATING_STARS
+            ],
+        )
+        .where(review.user_id == user_id)
+        .group_by(review.product_id)
+        .subquery()
+    )
+
+    stats = models.ProductRating
+    new_sum = stats.rating_sum - per_product.c.rating_sum
+    new_count = stats.reviews_count - per_product.c.reviews_count
+
+    return db.execute(
+        update(stats)
+        .where(stats.product_id == per_product.c.product_id)
+        .values(
+            rating_sum=new_sum,
+            reviews_count=new_count,
+            average_rating=case(
+                (new_count > 0, cast(new_sum, Float) / new_count), else_=0
+            ),
+            **{
+                f"rating_{star}": getattr(stats, f"rating_{star}")
+                - per_product.c[f"rating_{star}"]
+                for star in RATING_STARS
+            },
+        )
+        .returning(stats.product_id)
+    ).scalars().all()
+
+
+def adjust_category_counts(db: Session, before=(), after=()):
+    """
+    Переносит в category_counts изменение товаров: before и after - пары (категория, остаток)
+    до и после изменения. Коммит остается за вызывающим кодом
+    """
+    deltas: dict[str, list[int]] = {}
+    for sign, states in ((-1, before), (1, after)):
+        for category, quantity in states:
+            delta = deltas.setdefault(category, [0, 0])
+            delta[0] += sign
+            delta[1] += sign * ((quantity or 0) > 0)
+
+    rows = [
+        {"category": category, "total": total, "in_stock": in_stock}
+        for category, (total, in_stock) in sorted(deltas.items())
+        if total or in_stock
+    ]
+    if not rows:
+        return
+
+    counts = models.CategoryCount.__table__.c
+    stmt = insert(models.CategoryCount).values(rows)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[counts.category],
+            set_={
+                "total": counts.total + stmt.excluded.total,
+                "in_stock": counts.in_stock + stmt.excluded.in_stock,
+            },
+        )
+    )
+    db.execute(
+        delete(models.CategoryCount).where(
+            models.CategoryCount.category.in_([row["category"] for row in rows]),
+            models.CategoryCount.total <= 0,
+        )
+    )
+
+
+def category_counts_query(categories=None):
+    product = models.Product
+    query = select(
+        product.category,
+        func.count(product.id).label("total"),
+        func.count(product.id).filter(product.quantity > 0).label("in_stock"),
+    ).group_by(product.category)
+    if categories is not None:
+        query = query.where(product.category.in_(categories))
+    return query
+
+
+def recount_categories(db: Session, categories=None):
+    """
+    Пересчитывает category_counts по products целиком или только для указанных категорий.
+    Используется массовыми операциями, где дешевле один GROUP BY, чем дельты по строкам
+    """
+    if categories is not None:
+        categories = list(categories)
+        if not categories:
+            return
+
+    clear = delete(models.CategoryCount)
+    if categories is not None:
+        clear = clear.where(models.CategoryCount.category.in_(categories))
+    db.execute(clear)
+    db.execute(
+        insert(models.CategoryCount).from_select(
+            ["category", "total", "in_stock"], category_counts_query(categories)
+        )
+    )
+
+
+def sales_day(timestamp):
+    # Дни продаж считаются по UTC, независимо от часового пояса сессии
+    return cast(func.timezone("UTC", timestamp), Date)
+
+
+def order_sales_query(sign: int = 1):
+    item = models.OrderItem
+    return (
+        select(
+            sales_day(models.Order.created_at).label("day"),
+            item.category,
+            item.product_id,
+            (literal(sign) * func.sum(item.quantity)).label("units"),
+            (literal(sign) * func.sum(item.quantity * item.price)).label("revenue"),
+        )
+        .join(models.Order, models.Order.id == item.order_id)
+        .group_by("day", item.category, item.product_id)
+    )
+
+
+def apply_order_sales(db: Session, order_ids, sign: int = 1):
+    """
+    Добавляет (sign=1) или вычитает (sign=-1) позиции заказов из дневных итогов sales_daily.
+    Коммит остается за вызывающим кодом
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+
+    sales = models.SalesDaily.__table__.c
+    stmt = insert(models.SalesDaily).from_select(
+        ["day", "category", "product_id", "units", "revenue"],
+        order_sales_query(sign).where(models.OrderItem.order_id.in_(order_ids)),
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[sales.day, sales.category, sales.product_id],
+            set_={
+                "units": sales.units + stmt.excluded.units,
+                "revenue": sales.revenue + stmt.excluded.revenue,
+            },
+        )
+    )
+
+
+def rebuild_sales(db: Session, since=None):
+    """
+    Пересчитывает sales_daily по заказам целиком или начиная с дня since
+    """
+    clear = delete(models.SalesDaily)
+    query = order_sales_query().where(
+        models.Order.status.is_distinct_from(ORDER_CANCELLED)
+    )
+    if since is not None:
+        clear = clear.where(models.SalesDaily.day >= since)
+        query = query.where(sales_day(models.Order.created_at) >= since)
+
+    db.execute(clear)
+    db.execute(
+        insert(models.SalesDaily).from_select(
+            ["day", "category", "product_id", "units", "revenue"], query
+        )
+    )
@@ -0,0 +1,91 @@
+import hashlib
+import json
+from datetime import timedelta
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from . import models
+from .config import settings
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(payload) -> str:
+    raw = json.dumps(jsonable_encoder(payload), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def reserve_key(
+    db: Session, user_id: int, scope: str, key: str, payload
+) -> JSONResponse | None:
+    """
+    Занимает ключ идемпотентности в текущей транзакции запроса.
+    Возвращает None, если запрос нужно выполнить, или сохраненный ответ первого запроса.
+    Параллельный дубль ждет на уникальном ключе, пока первая транзакция не завершится
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ключ идемпотентности должен содержать от 1 до {MAX_KEY_LENGTH} символов",
+        )
+
+    keys = models.IdempotencyKey
+    fingerprint = request_fingerprint(payload)
+
+    db.execute(
+        delete(keys).where(keys.user_id == user_id, keys.expires_at <= func.now())
+    )
+    reserved = db.execute(
+        insert(keys)
+        .values(
+            user_id=user_id,
+            scope=scope,
+            key=key,
+            request_hash=fingerprint,
+            expires_at=func.now() + timedelta(seconds=settings.idempotency_ttl_seconds),
+        )
+        .on_conflict_do_nothing()
+        .returning(keys.key)
+    ).first()
+    if reserved:
+        return None
+
+    stored = db.execute(
+        select(keys.request_hash, keys.status_code, keys.response).where(
+            keys.user_id == user_id, keys.scope == scope, keys.key == key
+        )
+    ).one()
+    if stored.request_hash != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Ключ идемпотентности уже использован для другого запроса",
+        )
+    if stored.status_code is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Запрос с этим ключом идемпотентности еще выполняется",
+        )
+    return JSONResponse(
+        status_code=stored.status_code,
+        content=stored.response,
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+def save_response(
+    db: Session, user_id: int, scope: str, key: str, status_code: int, body
+):
+    """
+    Сохраняет ответ для повторов. Коммит остается за вызывающим кодом:
+    ответ фиксируется вместе с результатом операции
+    """
+    keys = models.IdempotencyKey
+    db.execute(
+        update(keys)
+        .where(keys.user_id == user_id, keys.scope == scope, keys.key == key)
+        .values(status_code=status_code, response=jsonable_encoder(body))
+    )
@@ -1,15 +1,34 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from . import models
-from .routers import users, products, orders, auth, cart
+from . import models, outbox
+from .config import settings
+from .routers import users, products, orders, auth, cart, exports
 from .database import engine
+from .pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
+from .idempotency import REPLAYED_HEADER
 
 # models.Base.metadata.create_all(bind=engine)
 os.makedirs("static/images", exist_ok=True)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    stop = asyncio.Event()
+    worker = None
+    if settings.outbox_worker_enabled:
+        outbox.load_handlers()
+        worker = asyncio.create_task(outbox.run_worker(stop))
+    yield
+    if worker is not None:
+        stop.set()
+        await worker
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -25,6 +44,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, REPLAYED_HEADER],
 )
 
 app.include_router(users.router)
@@ -32,6 +52,7 @@ app.include_router(auth.router)
 app.include_router(products.router)
 app.include_router(orders.router)
 app.include_router(cart.router)
+app.include_router(exports.router)
 
 
 @app.get("/")
@@ -1,9 +1,28 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import (
+    BigInteger,
+    CheckConstraint,
+    Column,
+    Date,
+    Integer,
+    String,
+    Float,
+    ForeignKey,
+    Index,
+    UniqueConstraint,
+)
 from sqlalchemy.sql.expression import text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from .database import Base
 
+ORDER_STATUSES = ("в обработке", "отправлен", "доставлен", "отменен")
+OPEN_ORDER_STATUSES = ("в обработке", "отправлен")
+
+
+def _status_list(statuses) -> str:
+    return ", ".join(f"'{value}'" for value in statuses)
+
 
 class User(Base):
     __tablename__ = "users"
@@ -21,6 +40,23 @@ class User(Base):
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_name_id", "name", "id"),
+        Index("ix_products_quantity_id", text("COALESCE(quantity, 0)"), "id"),
+        Index(
+            "ix_products_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_products_description_trgm",
+            "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+    )
 
     id = Column(Integer, primary_key=True, nullable=False)
     name = Column(String, nullable=False)
@@ -35,10 +71,30 @@ class Product(Base):
     order_items = relationship("OrderItem", back_populates="product")
     cart_items = relationship("CartItem", back_populates="product")
     reviews = relationship("ProductReview", back_populates="product")
+    rating = relationship("ProductRating", back_populates="product", uselist=False)
 
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        CheckConstraint(
+            f"status IN ({_status_list(ORDER_STATUSES)})", name="ck_orders_status"
+        ),
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        Index(
+            "ix_orders_user_id_created_at_id",
+            "user_id",
+            text("created_at DESC"),
+            text("id DESC"),
+        ),
+        # Очередь необработанных заказов остается маленькой, сколько бы ни накопилось истории
+        Index(
+            "ix_orders_open_created_at",
+            "created_at",
+            "id",
+            postgresql_where=text(f"status IN ({_status_list(OPEN_ORDER_STATUSES)})"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, nullable=False)
     user_id = Column(
@@ -48,7 +104,12 @@ class Order(Base):
     created_at = Column(
         TIMESTAMP(timezone=True), nullable=False, server_default=text("now()")
     )
-    status = Column(String, default="в обработке")
+    status = Column(
+        String,
+        nullable=False,
+        default="в обработке",
+        server_default=text("'в обработке'"),
+    )
     address = Column(String, nullable=False)
     phone = Column(String, nullable=False)
 
@@ -68,6 +129,8 @@ class OrderItem(Base):
     )
     quantity = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)
+    # Категория товара на момент покупки: по ней ведутся итоги продаж, даже если товар перенесут
+    category = Column(String, nullable=False)
 
     order = relationship("Order", back_populates="items")
     product = relationship("Product")
@@ -75,6 +138,8 @@ class OrderItem(Base):
 
 class Cart(Base):
     __tablename__ = "cart"
+    __table_args__ = (UniqueConstraint("user_id", name="uq_cart_user_id"),)
+
     id = Column(Integer, primary_key=True, nullable=False)
     user_id = Column(
         Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
@@ -89,6 +154,12 @@ class Cart(Base):
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    __table_args__ = (
+        UniqueConstraint(
+            "cart_id", "product_id", name="uq_cart_items_cart_id_product_id"
+        ),
+    )
+
     id = Column(Integer, primary_key=True, nullable=False)
     cart_id = Column(Integer, ForeignKey("cart.id", ondelete="CASCADE"), nullable=False)
     product_id = Column(
@@ -103,6 +174,14 @@ class CartItem(Base):
 
 class ProductReview(Base):
     __tablename__ = "product_reviews"
+    __table_args__ = (
+        Index(
+            "ix_product_reviews_product_id_created_at_id",
+            "product_id",
+            text("created_at DESC"),
+            text("id DESC"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, nullable=False)
     product_id = Column(
@@ -118,3 +197,92 @@ class ProductReview(Base):
 
     product = relationship("Product", back_populates="reviews")
     user = relationship("User", back_populates="reviews")
+
+
+class ProductRating(Base):
+    __tablename__ = "product_ratings"
+    __table_args__ = (
+        Index("ix_product_ratings_average_rating_id", "average_rating", "product_id"),
+        Index("ix_product_ratings_reviews_count_id", "reviews_count", "product_id"),
+    )
+
+    product_id = Column(
+        Integer,
+        ForeignKey("products.id", ondelete="CASCADE"),
+        primary_key=True,
+        nullable=False,
+    )
+    rating_sum = Column(Integer, nullable=False, server_default=text("0"))
+    reviews_count = Column(Integer, nullable=False, server_default=text("0"))
+    average_rating = Column(Float, nullable=False, server_default=text("0"))
+    rating_1 = Column(Integer, nullable=False, server_default=text("0"))
+    rating_2 = Column(Integer, nullable=False, server_default=text("0"))
+    rating_3 = Column(Integer, nullable=False, server_default=text("0"))
+    rating_4 = Column(Integer, nullable=False, server_default=text("0"))
+    rating_5 = Column(Integer, nullable=False, server_default=text("0"))
+
+    product = relationship("Product", back_populates="rating")
+
+
+class CategoryCount(Base):
+    __tablename__ = "category_counts"
+
+    category = Column(String, primary_key=True, nullable=False)
+    total = Column(Integer, nullable=False, server_default=text("0"))
+    in_stock = Column(Integer, nullable=False, server_default=text("0"))
+
+
+class SalesDaily(Base):
+    __tablename__ = "sales_daily"
+
+    day = Column(Date, primary_key=True, nullable=False)
+    category = Column(String, primary_key=True, nullable=False)
+    product_id = Column(Integer, primary_key=True, nullable=False)
+    units = Column(Integer, nullable=False, server_default=text("0"))
+    revenue = Column(Float, nullable=False, server_default=text("0"))
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+        nullable=False,
+    )
+    scope = Column(String, primary_key=True, nullable=False)
+    key = Column(String, primary_key=True, nullable=False)
+    request_hash = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response = Column(JSONB, nullable=True)
+    created_at = Column(
+        TIMESTAMP(timezone=True), nullable=False, server_default=text("now()")
+    )
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        # Воркер выбирает только необработанные события, обработанные в индекс не попадают
+        Index(
+            "ix_outbox_events_pending",
+            "available_at",
+            "id",
+            postgresql_where=text("processed_at IS NULL"),
+        ),
+    )
+
+    id = Column(BigInteger, primary_key=True, nullable=False)
+    event_type = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(
+        TIMESTAMP(timezone=True), nullable=False, server_default=text("now()")
+    )
+    available_at = Column(
+        TIMESTAMP(timezone=True), nullable=False, server_default=text("now()")
+    )
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    last_error = Column(String, nullable=True)
+    processed_at = Column(TIMESTAMP(timezone=True), nullable=True)
@@ -0,0 +1,177 @@
+"""
+Транзакционный outbox: события пишутся в outbox_events в той же транзакции, что и изменение данных,
+а обработчики выполняются позже воркером. Воркер запускается отдельным процессом:
+
+    python -m app.outbox          # обработать накопившиеся события и выйти
+    python -m app.outbox --watch  # обрабатывать события непрерывно
+
+или вместе с приложением, если включить settings.outbox_worker_enabled. По умолчанию это выключено:
+встроенный воркер занимает соединение из пула запросов при каждом опросе очереди.
+
+Обработчик получает сессию воркера и событие и регистрируется декоратором в модуле
+из settings.outbox_handler_modules:
+
+    @outbox.handler(outbox.ORDER_CREATED)
+    def send_confirmation(db, event): ...
+
+Доставка "хотя бы один раз": после ошибки или падения воркера событие обрабатывается заново
+всеми обработчиками, поэтому они должны быть идемпотентными
+"""
+
+import argparse
+import asyncio
+import importlib
+import logging
+import sys
+import time
+from collections import defaultdict
+from datetime import timedelta
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+from . import database, models
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+ORDER_CREATED = "order.created"
+MAX_RETRY_DELAY_SECONDS = 300
+MAX_ERROR_LENGTH = 1000
+
+_handlers: dict[str, list] = defaultdict(list)
+
+
+def handler(event_type: str):
+    def register(func):
+        _handlers[event_type].append(func)
+        return func
+
+    return register
+
+
+def load_handlers():
+    for module in settings.outbox_handler_modules:
+        importlib.import_module(module)
+
+
+def enqueue(db: Session, event_type: str, payload: dict):
+    """
+    Добавляет событие в текущую транзакцию: оно станет видно воркеру только после коммита
+    """
+    db.execute(
+        insert(models.OutboxEvent).values(
+            event_type=event_type, payload=jsonable_encoder(payload)
+        )
+    )
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(2**attempts, MAX_RETRY_DELAY_SECONDS))
+
+
+def process_batch(db: Session, batch_size: int) -> int:
+    """
+    Обрабатывает до batch_size готовых событий и коммитит результат.
+    SKIP LOCKED позволяет нескольким воркерам разбирать очередь, не дожидаясь друг друга.
+    Каждое событие обрабатывается в своей точке сохранения, ошибка откладывает только его
+    """
+    events = models.OutboxEvent
+    batch = (
+        db.execute(
+            select(events)
+            .where(
+                events.processed_at.is_(None),
+                events.available_at <= func.now(),
+                events.attempts < settings.outbox_max_attempts,
+            )
+            .order_by(events.available_at, events.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        .scalars()
+        .all()
+    )
+
+    for event in batch:
+        try:
+            with db.begin_nested():
+                for event_handler in _handlers.get(event.event_type, ()):
+                    event_handler(db, event)
+        except Exception as e:
+            logger.exception(
+                "Не удалось обработать событие outbox %s (%s)", event.id, event.event_type
+            )
+            event.attempts += 1
+            event.last_error = f"{type(e).__name__}: {e}"[:MAX_ERROR_LENGTH]
+            event.available_at = func.now() + retry_delay(event.attempts)
+        else:
+            event.processed_at = func.now()
+            event.last_error = None
+
+    db.commit()
+    return len(batch)
+
+
+def drain(batch_size: int | None = None) -> int:
+    """
+    Обрабатывает пачками все готовые события. Отложенные после ошибки события ждут своей очереди
+    """
+    batch_size = batch_size or settings.outbox_batch_size
+    total = 0
+    db = database.SessionLocal()
+    try:
+        while True:
+            processed = process_batch(db, batch_size)
+            total += processed
+            if processed < batch_size:
+                return total
+    finally:
+        db.close()
+
+
+async def run_worker(stop: asyncio.Event):
+    """
+    Фоновая задача приложения. Обработчики синхронные, поэтому пачки выполняются в отдельном потоке
+    и не блокируют цикл событий
+    """
+    while not stop.is_set():
+        try:
+            await asyncio.to_thread(drain)
+        except Exception:
+            logger.exception("Ошибка воркера outbox")
+        try:
+            await asyncio.wait_for(stop.wait(), settings.outbox_poll_interval_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Обработка событий outbox")
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="не завершаться, а опрашивать очередь каждые outbox_poll_interval_seconds",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.outbox_batch_size,
+        help="сколько событий обрабатывать в одной транзакции",
+    )
+    args = parser.parse_args(argv)
+
+    load_handlers()
+    if not args.watch:
+        print(f"Обработано событий: {drain(args.batch_size)}")
+        return 0
+
+    try:
+        while True:
+            drain(args.batch_size)
+            time.sleep(settings.outbox_poll_interval_seconds)
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
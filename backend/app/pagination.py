@@ -0,0 +1,77 @@
+import base64
+import json
+from fastapi import HTTPException, status
+from sqlalchemy import asc, desc, func, literal, select, tuple_
+from sqlalchemy.orm import Session
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_COUNT_MODES = {"exact", "estimated"}
+
+
+def encode_cursor(*values) -> str:
+    """
+    Упаковывает значения ключа последней строки страницы в непрозрачную строку
+    """
+    raw = json.dumps(values, ensure_ascii=False, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        values = None
+
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации",
+        )
+    return values
+
+
+def keyset_order(sort_column, id_column, descending: bool):
+    """
+    Порядок сортировки с уникальным id в качестве второго ключа
+    """
+    direction = desc if descending else asc
+    return direction(sort_column), direction(id_column)
+
+
+def keyset_after(sort_column, id_column, last_value, last_id, descending: bool):
+    """
+    Условие "строго после (last_value, last_id)" в порядке keyset_order.
+    Сравнение кортежей обслуживается составным индексом и не зависит от глубины страницы
+    """
+    key = tuple_(sort_column, id_column)
+    last_key = tuple_(
+        literal(last_value, type_=sort_column.type),
+        literal(last_id, type_=id_column.type),
+    )
+    if descending:
+        return key < last_key
+    return key > last_key
+
+
+def exact_count(db: Session, statement) -> int:
+    return db.execute(
+        select(func.count()).select_from(statement.order_by(None).subquery())
+    ).scalar_one()
+
+
+def estimated_count(db: Session, statement) -> int:
+    """
+    Оценка числа строк из плана запроса: использует статистику планировщика и не читает таблицу.
+    render_postcompile раскрывает списки IN в отдельные параметры, иначе в тексте остаются заглушки
+    """
+    compiled = statement.order_by(None).compile(
+        dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True}
+    )
+    plan = (
+        db.connection()
+        .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params)
+        .scalar_one()
+    )
+    return int(plan[0]["Plan"]["Plan Rows"])
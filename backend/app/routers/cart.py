@@ -1,40 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import asc, desc
+from sqlalchemy import asc, column, delete, desc, func, literal, select, values
+from sqlalchemy.dialects.postgresql import insert
 from .. import models, schemas, oauth2
 from .. import database
 
 router = APIRouter(prefix="/cart", tags=["Cart"])
 
+MAX_CART_OPERATIONS = 500
 
-@router.get("/", response_model=list[schemas.CartItemBase])
-def get_cart(
-    db: Session = Depends(database.get_db),
-    current_user: schemas.User = Depends(oauth2.get_current_user),
-):
-    cart = db.query(models.Cart).filter(models.Cart.user_id == current_user.id).first()
-
-    if not cart:
-        return []
-    # if not cart:
-    #     raise HTTPException(
-    #         status_code=status.HTTP_404_NOT_FOUND,
-    #         detail="Корзина пуста"
-    #     )
 
+def cart_lines(db: Session, cart_id: int) -> list[dict]:
     results = (
         db.query(models.CartItem, models.Product)
         .join(models.Product, models.Product.id == models.CartItem.product_id)
-        .filter(models.CartItem.cart_id == cart.id)
+        .filter(models.CartItem.cart_id == cart_id)
+        .order_by(models.CartItem.id)
         .all()
     )
 
-    # if not results:
-    #     raise HTTPException(
-    #         status_code=status.HTTP_404_NOT_FOUND,
-    #         detail="Корзина пуста"
-    #     )
-
     items = []
     for cart_item, product in results:
         items.append(
@@ -49,6 +33,202 @@ def get_cart(
     return items
 
 
+def fold_cart_operations(operations: list[schemas.CartOperation]) -> dict[int, tuple[bool, int]]:
+    """
+    Сводит операции к одному итоговому изменению на товар с учетом их порядка:
+    (True, q) - установить количество q (0 - удалить позицию), (False, d) - прибавить d к текущему
+    """
+    changes: dict[int, tuple[bool, int]] = {}
+    for operation in operations:
+        if operation.op == "remove":
+            changes[operation.product_id] = (True, 0)
+            continue
+
+        if operation.quantity is None or operation.quantity < (1 if operation.op == "add" else 0):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Некорректное количество для товара с id {operation.product_id}",
+            )
+        if operation.op == "set":
+            changes[operation.product_id] = (True, operation.quantity)
+        else:
+            replace, quantity = changes.get(operation.product_id, (False, 0))
+            changes[operation.product_id] = (replace, quantity + operation.quantity)
+    return changes
+
+
+@router.get("/", response_model=list[schemas.CartItemBase])
+def get_cart(
+    db: Session = Depends(database.get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user),
+):
+    cart = db.query(models.Cart).filter(models.Cart.user_id == current_user.id).first()
+
+    if not cart:
+        return []
+    # if not cart:
+    #     raise HTTPException(
+    #         status_code=status.HTTP_404_NOT_FOUND,
+    #         detail="Корзина пуста"
+    #     )
+
+    return cart_lines(db, cart.id)  # type: ignore
+
+
+@router.get("/summary", response_model=schemas.CartSummary)
+def get_cart_summary(
+    db: Session = Depends(database.get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user),
+):
+    """
+    Позиции корзины с итогами и признаками расхождений одним запросом.
+    Сумма считается по текущим ценам товаров: по ним create_order выставит счет
+    """
+    cart_item = models.CartItem
+    product = models.Product
+    line_total = product.price * cart_item.quantity
+    # Товар без указанного остатка оформить нельзя, как и при оформлении заказа
+    available = func.coalesce(product.quantity, 0)
+
+    rows = db.execute(
+        select(
+            cart_item.id,
+            cart_item.product_id,
+            product.name,
+            cart_item.price,
+            product.price.label("current_price"),
+            cart_item.quantity,
+            available.label("available"),
+            product.image_url,
+            (cart_item.price != product.price).label("price_changed"),
+            (cart_item.quantity > available).label("insufficient_stock"),
+            func.sum(line_total).over().label("subtotal"),
+            func.sum(cart_item.quantity).over().label("item_count"),
+        )
+        .join(models.Cart, models.Cart.id == cart_item.cart_id)
+        .join(product, product.id == cart_item.product_id)
+        .where(models.Cart.user_id == current_user.id)
+        .order_by(cart_item.id)
+    ).mappings().all()
+
+    return {
+        "items": rows,
+        "subtotal": rows[0]["subtotal"] if rows else 0,
+        "item_count": rows[0]["item_count"] if rows else 0,
+        "can_checkout": bool(rows) and not any(row["insufficient_stock"] for row in rows),
+    }
+
+
+@router.patch("/", response_model=list[schemas.CartItemBase])
+def update_cart(
+    payload: schemas.CartBatchUpdate,
+    db: Session = Depends(database.get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user),
+):
+    """
+    Применяет пачку операций add/set/remove одной транзакцией и возвращает корзину.
+    Операции сводятся по товарам, затем выполняются одним DELETE и двумя upsert.
+    Если после изменений какого-то товара не хватает на складе, не применяется ни одна операция
+    """
+    if len(payload.operations) > MAX_CART_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"За один запрос можно выполнить не более {MAX_CART_OPERATIONS} операций",
+        )
+    changes = fold_cart_operations(payload.operations)
+
+    carts = models.Cart.__table__
+    cart_items = models.CartItem.__table__
+    products = models.Product.__table__
+
+    cart_insert = insert(carts).values(user_id=current_user.id)
+    cart_id = db.execute(
+        cart_insert.on_conflict_do_update(
+            constraint="uq_cart_user_id",
+            set_={"user_id": cart_insert.excluded.user_id},
+        ).returning(carts.c.id)
+    ).scalar_one()
+
+    removed = [product_id for product_id, (_, quantity) in changes.items() if quantity == 0]
+    if removed:
+        db.execute(
+            delete(cart_items).where(
+                cart_items.c.cart_id == cart_id, cart_items.c.product_id.in_(removed)
+            )
+        )
+
+    upserts = {
+        product_id: change for product_id, change in changes.items() if change[1] > 0
+    }
+    if upserts:
+        existing = set(
+            db.execute(
+                select(products.c.id).where(products.c.id.in_(upserts))
+            ).scalars()
+        )
+        missing = sorted(set(upserts) - existing)
+        if missing:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Товары не найдены: {', '.join(map(str, missing))}",
+            )
+
+        # set заменяет количество, add прибавляет к текущему; для новой позиции оба вставляют строку
+        for replace in (True, False):
+            rows = [
+                (product_id, quantity)
+                for product_id, (is_set, quantity) in sorted(upserts.items())
+                if is_set == replace
+            ]
+            if not rows:
+                continue
+            changes_rows = values(
+                column("product_id", cart_items.c.product_id.type),
+                column("quantity", cart_items.c.quantity.type),
+                name="changes",
+            ).data(rows)
+            item_insert = insert(cart_items).from_select(
+                ["cart_id", "product_id", "quantity", "price"],
+                select(
+                    literal(cart_id),
+                    changes_rows.c.product_id,
+                    changes_rows.c.quantity,
+                    products.c.price,
+                ).join(products, products.c.id == changes_rows.c.product_id),
+            )
+            quantity = item_insert.excluded.quantity
+            if not replace:
+                quantity = cart_items.c.quantity + quantity
+            db.execute(
+                item_insert.on_conflict_do_update(
+                    constraint="uq_cart_items_cart_id_product_id",
+                    set_={"quantity": quantity},
+                )
+            )
+
+        shortage = db.execute(
+            select(products.c.name)
+            .join(cart_items, cart_items.c.product_id == products.c.id)
+            .where(
+                cart_items.c.cart_id == cart_id,
+                cart_items.c.product_id.in_(upserts),
+                cart_items.c.quantity > func.coalesce(products.c.quantity, 0),
+            )
+            .order_by(products.c.id)
+        ).scalars().all()
+        if shortage:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Недостаточно товара на складе: {', '.join(shortage)}",
+            )
+
+    items = cart_lines(db, cart_id)
+    db.commit()
+    return items
+
+
 @router.delete("/{item_id}")
 def delete_cart_item(
     item_id: int,
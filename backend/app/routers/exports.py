@@ -0,0 +1,151 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import func, select
+from .. import models, schemas, oauth2
+from ..streaming import export_response
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+
+def check_admin(current_user: schemas.User):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Доступ запрещен: только администраторы могут выгружать данные",
+        )
+
+
+def created_between(column, created_from: datetime | None, created_to: datetime | None):
+    conditions = []
+    if created_from is not None:
+        conditions.append(column >= created_from)
+    if created_to is not None:
+        conditions.append(column < created_to)
+    return conditions
+
+
+@router.get("/orders")
+def export_orders(
+    current_user: schemas.User = Depends(oauth2.get_current_user),
+    format: str = Query("csv", description="csv, ndjson или parquet"),
+    created_from: datetime | None = Query(None, description="Заказы начиная с даты"),
+    created_to: datetime | None = Query(None, description="Заказы до даты"),
+):
+    """
+    Выгрузка заказов потоком: строки читаются серверным курсором и отдаются по мере чтения
+    """
+    check_admin(current_user)
+
+    items_count = (
+        select(func.count(models.OrderItem.id))
+        .where(models.OrderItem.order_id == models.Order.id)
+        .scalar_subquery()
+    )
+    statement = (
+        select(
+            models.Order.id,
+            models.Order.user_id,
+            models.Order.created_at,
+            models.Order.status,
+            models.Order.total_price,
+            models.Order.address,
+            models.Order.phone,
+            items_count.label("items_count"),
+        )
+        .where(*created_between(models.Order.created_at, created_from, created_to))
+        .order_by(models.Order.id)
+    )
+    return export_response(statement, format, "orders")
+
+
+@router.get("/order_items")
+def export_order_items(
+    current_user: schemas.User = Depends(oauth2.get_current_user),
+    format: str = Query("csv", description="csv, ndjson или parquet"),
+    created_from: datetime | None = Query(None, description="Заказы начиная с даты"),
+    created_to: datetime | None = Query(None, description="Заказы до даты"),
+):
+    check_admin(current_user)
+
+    statement = (
+        select(
+            models.OrderItem.order_id,
+            models.OrderItem.id,
+            models.Order.created_at,
+            models.Order.status,
+            models.OrderItem.product_id,
+            models.Product.name.label("product_name"),
+            models.Product.category,
+            models.OrderItem.quantity,
+            models.OrderItem.price,
+        )
+        .join(models.Order, models.Order.id == models.OrderItem.order_id)
+        .join(models.Product, models.Product.id == models.OrderItem.product_id)
+        .where(*created_between(models.Order.created_at, created_from, created_to))
+        .order_by(models.OrderItem.order_id, models.OrderItem.id)
+    )
+    return export_response(statement, format, "order_items")
+
+
+@router.get("/users")
+def export_users(
+    current_user: schemas.User = Depends(oauth2.get_current_user),
+    format: str = Query("csv", description="csv, ndjson или parquet"),
+):
+    check_admin(current_user)
+
+    orders = (
+        select(
+            models.Order.user_id,
+            func.count(models.Order.id).label("orders"),
+            func.sum(models.Order.total_price).label("total_spent"),
+        )
+        .group_by(models.Order.user_id)
+        .subquery()
+    )
+    statement = (
+        select(
+            models.User.id,
+            models.User.username,
+            models.User.last_name,
+            models.User.email,
+            models.User.role,
+            func.coalesce(orders.c.orders, 0).label("orders"),
+            func.coalesce(orders.c.total_spent, 0).label("total_spent"),
+        )
+        .outerjoin(orders, orders.c.user_id == models.User.id)
+        .order_by(models.User.id)
+    )
+    return export_response(statement, format, "users")
+
+
+@router.get("/products")
+def export_products(
+    current_user: schemas.User = Depends(oauth2.get_current_user),
+    format: str = Query("csv", description="csv, ndjson или parquet"),
+):
+    """
+    Колонки совпадают с форматом импорта /products/import, выгрузку можно загрузить обратно
+    """
+    check_admin(current_user)
+
+    statement = (
+        select(
+            models.Product.id,
+            models.Product.name,
+            models.Product.description,
+            models.Product.price,
+            models.Product.original_price,
+            models.Product.discount,
+            models.Product.quantity,
+            models.Product.category,
+            models.Product.image_url,
+            func.coalesce(models.ProductRating.average_rating, 0).label("average_rating"),
+            func.coalesce(models.ProductRating.reviews_count, 0).label("reviews_count"),
+        )
+        .outerjoin(
+            models.ProductRating, models.ProductRating.product_id == models.Product.id
+        )
+        .order_by(models.Product.id)
+    )
+    return export_response(statement, format, "products")
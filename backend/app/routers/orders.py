@@ -1,19 +1,101 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query, Header
 from sqlalchemy.orm import Session
-from sqlalchemy import asc, desc
-from .. import models, schemas, oauth2
+from sqlalchemy import delete, func, insert, select, update
+from .. import models, schemas, oauth2, crud, outbox
 from .. import database
+from ..cache import invalidate_products
+from ..idempotency import reserve_key, save_response
+from ..pagination import (
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    encode_cursor,
+    keyset_after,
+    keyset_order,
+)
 
 ALLOWED_SORT_FIELDS = {"total_price", "status", "created_at", "user_id"}
+MAX_ORDERS_PAGE_SIZE = 200
+DEFAULT_ORDERS_PAGE_SIZE = 50
+MAX_BULK_STATUS_ORDERS = 5000
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
 
+def status_conditions(statuses: list[str] | None, search_by_status: str) -> list:
+    """
+    Точный фильтр по списку статусов обслуживается индексами по status,
+    поиск по подстроке оставлен для совместимости и применяется, только если он задан
+    """
+    conditions = []
+    if statuses:
+        invalid = [value for value in statuses if value not in models.ORDER_STATUSES]
+        if invalid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Недопустимый статус заказа: {', '.join(invalid)}",
+            )
+        conditions.append(models.Order.status.in_(statuses))
+    if search_by_status:
+        conditions.append(models.Order.status.ilike(f"%{search_by_status}%"))
+    return conditions
+
+
+def product_name_condition(search: str):
+    """
+    Заказ содержит товар с подходящим названием. EXISTS не размножает строки заказа по позициям
+    """
+    return (
+        select(models.OrderItem.id)
+        .join(models.Product, models.Product.id == models.OrderItem.product_id)
+        .where(
+            models.OrderItem.order_id == models.Order.id,
+            models.Product.name.ilike(f"%{search}%"),
+        )
+        .exists()
+    )
+
+
+def order_items_by_order(db: Session, order_ids: list[int]) -> dict[int, list[dict]]:
+    """
+    Позиции для страницы заказов одним запросом с IN по id заказов
+    """
+    if not order_ids:
+        return {}
+
+    rows = (
+        db.query(models.OrderItem, models.Product)
+        .join(models.Product, models.Product.id == models.OrderItem.product_id)
+        .filter(models.OrderItem.order_id.in_(order_ids))
+        .order_by(models.OrderItem.order_id, models.OrderItem.id)
+        .all()
+    )
+
+    items: dict[int, list[dict]] = {}
+    for order_item, product in rows:
+        items.setdefault(order_item.order_id, []).append(
+            {
+                "id": order_item.id,
+                "product_id": order_item.product_id,
+                "order_id": order_item.order_id,
+                "quantity": order_item.quantity,
+                "name": product.name,
+                "description": product.description,
+                "price": order_item.price,
+                "image_url": product.image_url,
+            }
+        )
+    return items
+
+
 @router.get("/", response_model=list[schemas.Order])
 def get_orders(
+    response: Response,
     db: Session = Depends(database.get_db),
     current_user: schemas.User = Depends(oauth2.get_current_user),
     search_by_status: str = Query("", detail="Поиск по статусу"),
+    statuses: list[str] = Query(
+        None, alias="status", description="Точный фильтр по одному или нескольким статусам"
+    ),
     search_by_product_name: str = Query("", detail="Поиск по названию товара в заказе"),
     max_total_price: float | None = Query(
         None, ge=0, detail="Фильтр по максимальной стоимости заказа"
@@ -23,6 +105,15 @@ def get_orders(
     ),
     sort_by: str | None = Query(None, description="Поле для сортировки"),
     sort_order: str = Query("desc", description="Порядок сортировки"),
+    limit: int = Query(
+        DEFAULT_ORDERS_PAGE_SIZE,
+        ge=1,
+        le=MAX_ORDERS_PAGE_SIZE,
+        description="Количество заказов на странице",
+    ),
+    cursor: str | None = Query(
+        None, description="Курсор следующей страницы из заголовка X-Next-Cursor"
+    ),
 ):
 
     if current_user.role != "admin":
@@ -39,22 +130,15 @@ def get_orders(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="min_total_price не может быть больше max_total_price",
         )
-    conditions = []
+    conditions = status_conditions(statuses, search_by_status)
     if max_total_price is not None:
         conditions.append(models.Order.total_price <= max_total_price)
 
     if min_total_price is not None:
         conditions.append(models.Order.total_price >= min_total_price)
 
-    query = (
-        db.query(models.Order, models.OrderItem, models.Product)
-        .filter(models.Order.status.ilike(f"%{search_by_status}%"), *conditions)
-        .join(models.OrderItem, models.Order.id == models.OrderItem.order_id)
-        .join(models.Product, models.Product.id == models.OrderItem.product_id)
-    )
-
-    if search_by_product_name is not None:
-        query = query.filter(models.Product.name.ilike(f"%{search_by_product_name}%"))
+    if search_by_product_name:
+        conditions.append(product_name_condition(search_by_product_name))
 
     if sort_by:
         if sort_by not in ALLOWED_SORT_FIELDS:
@@ -63,50 +147,127 @@ def get_orders(
                 detail=f"Недопустимое поле сортировки: {sort_by}",
             )
         sort_column = getattr(models.Order, sort_by)
-        query = query.order_by(
-            asc(sort_column) if sort_order == "asc" else desc(sort_column)
+        descending = sort_order != "asc"
+    else:
+        sort_column = models.Order.id
+        descending = False
+
+    # Сначала выбирается страница заказов, позиции грузятся только для нее
+    query = (
+        db.query(models.Order)
+        .filter(*conditions)
+        .order_by(*keyset_order(sort_column, models.Order.id, descending))
+    )
+
+    if cursor:
+        cursor_sort, cursor_descending, last_value, last_id = decode_cursor(cursor, 4)
+        if cursor_sort != (sort_by or "id") or cursor_descending != descending:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Курсор не соответствует параметрам сортировки",
+            )
+        query = query.filter(
+            keyset_after(sort_column, models.Order.id, last_value, last_id, descending)
         )
 
-    else:
-        query = query.order_by(models.Order.id)
-
-    results = query.all()
-
-    orders_dict = {}
-    for order, order_item, product in results:
-        if order.id not in orders_dict:
-            orders_dict[order.id] = {
-                "id": order.id,
-                "user_id": order.user_id,
-                "created_at": order.created_at,
-                "total_price": order.total_price,
-                "status": order.status,
-                "address": order.address,
-                "phone": order.phone,
-                "items": [],
-            }
-        orders_dict[order.id]["items"].append(
-            {
-                "id": order_item.id,
-                "product_id": order_item.product_id,
-                "order_id": order_item.order_id,
-                "quantity": order_item.quantity,
-                "name": product.name,
-                "description": product.description,
-                "price": order_item.price,
-                "image_url": product.image_url,
-            }
+    orders = query.limit(limit + 1).all()
+    if len(orders) > limit:
+        orders = orders[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            sort_by or "id",
+            descending,
+            getattr(orders[-1], sort_by or "id"),
+            orders[-1].id,
+        )
+
+    items = order_items_by_order(db, [order.id for order in orders])
+    return [
+        {
+            "id": order.id,
+            "user_id": order.user_id,
+            "created_at": order.created_at,
+            "total_price": order.total_price,
+            "status": order.status,
+            "address": order.address,
+            "phone": order.phone,
+            "items": items.get(order.id, []),
+        }
+        for order in orders
+    ]
+
+
+def sales_period(days: int):
+    return models.SalesDaily.day > crud.sales_day(func.now()) - days
+
+
+@router.get("/stats/daily", response_model=list[schemas.SalesByDay])
+def get_sales_by_day(
+    db: Session = Depends(database.get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user),
+    days: int = Query(30, ge=1, le=366, description="Количество последних дней"),
+    category: str | None = Query(None, description="Фильтр по категории"),
+):
+    """
+    Выручка и проданные единицы по дням из итогов sales_daily, без отмененных заказов
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Доступ запрещен: только администраторы могут просматривать статистику",
+        )
+
+    sales = models.SalesDaily
+    query = (
+        select(
+            sales.day,
+            func.sum(sales.units).label("units"),
+            func.sum(sales.revenue).label("revenue"),
         )
-    orders = list(orders_dict.values())
+        .where(sales_period(days))
+        .group_by(sales.day)
+        .order_by(sales.day)
+    )
+    if category:
+        query = query.where(sales.category == category)
 
-    return orders
+    return [dict(row) for row in db.execute(query).mappings()]
+
+
+@router.get("/stats/categories", response_model=list[schemas.SalesByCategory])
+def get_sales_by_category(
+    db: Session = Depends(database.get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user),
+    days: int = Query(30, ge=1, le=366, description="Количество последних дней"),
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Доступ запрещен: только администраторы могут просматривать статистику",
+        )
+
+    sales = models.SalesDaily
+    query = (
+        select(
+            sales.category,
+            func.sum(sales.units).label("units"),
+            func.sum(sales.revenue).label("revenue"),
+        )
+        .where(sales_period(days))
+        .group_by(sales.category)
+        .order_by(func.sum(sales.revenue).desc())
+    )
+    return [dict(row) for row in db.execute(query).mappings()]
 
 
 @router.get("/my_orders", response_model=list[schemas.OrderBase])
 def get_my_orders(
+    response: Response,
     db: Session = Depends(database.get_db),
     current_user: schemas.User = Depends(oauth2.get_current_user),
     search_by_status: str = Query("", detail="Поиск по статусу"),
+    statuses: list[str] = Query(
+        None, alias="status", description="Точный фильтр по одному или нескольким статусам"
+    ),
     search_by_product_name: str = Query("", detail="Поиск по названию товара в заказе"),
     max_total_price: float | None = Query(
         None, ge=0, detail="Фильтр по максимальной стоимости заказа"
@@ -116,6 +277,15 @@ def get_my_orders(
     ),
     sort_by: str | None = Query(None, description="Поле для сортировки"),
     sort_order: str = Query("desc", description="Порядок сортировки"),
+    limit: int = Query(
+        DEFAULT_ORDERS_PAGE_SIZE,
+        ge=1,
+        le=MAX_ORDERS_PAGE_SIZE,
+        description="Количество заказов на странице",
+    ),
+    cursor: str | None = Query(
+        None, description="Курсор следующей страницы из заголовка X-Next-Cursor"
+    ),
 ):
     if (
         min_total_price is not None
@@ -126,25 +296,15 @@ def get_my_orders(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="min_total_price не может быть больше max_total_price",
         )
-    conditions = []
+    conditions = status_conditions(statuses, search_by_status)
     if max_total_price is not None:
         conditions.append(models.Order.total_price <= max_total_price)
 
     if min_total_price is not None:
         conditions.append(models.Order.total_price >= min_total_price)
 
-    query = (
-        db.query(models.Order, models.OrderItem, models.Product)
-        .join(models.OrderItem, models.Order.id == models.OrderItem.order_id)
-        .join(models.Product, models.Product.id == models.OrderItem.product_id)
-        .filter(
-            models.Order.user_id == current_user.id,
-            models.Order.status.ilike(f"%{search_by_status}%"),
-            *conditions,
-        )
-    )
-    if search_by_product_name is not None:
-        query = query.filter(models.Product.name.ilike(f"%{search_by_product_name}%"))
+    if search_by_product_name:
+        conditions.append(product_name_condition(search_by_product_name))
 
     if sort_by:
         if sort_by not in ALLOWED_SORT_FIELDS:
@@ -152,39 +312,111 @@ def get_my_orders(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Недопустимое поле сортировки: {sort_by}",
             )
-        sort_column = getattr(models.Order, sort_by)
-        query = query.order_by(
-            asc(sort_column) if sort_order == "asc" else desc(sort_column)
+    # По умолчанию новые заказы сверху: порядок совпадает с индексом (user_id, created_at DESC, id DESC)
+    sort_field = sort_by or "created_at"
+    sort_column = getattr(models.Order, sort_field)
+    descending = sort_order != "asc"
+
+    query = (
+        db.query(models.Order)
+        .filter(models.Order.user_id == current_user.id, *conditions)
+        .order_by(*keyset_order(sort_column, models.Order.id, descending))
+    )
+
+    if cursor:
+        cursor_sort, cursor_descending, last_value, last_id = decode_cursor(cursor, 4)
+        if cursor_sort != sort_field or cursor_descending != descending:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Курсор не соответствует параметрам сортировки",
+            )
+        query = query.filter(
+            keyset_after(sort_column, models.Order.id, last_value, last_id, descending)
         )
 
-    else:
-        query = query.order_by(models.Order.id)
-
-    results = query.all()
-    orders_dict = {}
-    for order, order_item, product in results:
-        if order.id not in orders_dict:
-            orders_dict[order.id] = {
-                "id": order.id,
-                "created_at": order.created_at,
-                "total_price": order.total_price,
-                "status": order.status,
-                "address": order.address,
-                "phone": order.phone,
-                "items": [],
-            }
-        orders_dict[order.id]["items"].append(
-            {
-                "id": order_item.id,
-                "product_id": product.id,
-                "name": product.name,
-                "price": order_item.price,
-                "quantity": order_item.quantity,
-                "image_url": product.image_url,
-            }
+    orders = query.limit(limit + 1).all()
+    if len(orders) > limit:
+        orders = orders[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            sort_field,
+            descending,
+            getattr(orders[-1], sort_field),
+            orders[-1].id,
+        )
+
+    items = order_items_by_order(db, [order.id for order in orders])
+    return [
+        {
+            "id": order.id,
+            "created_at": order.created_at,
+            "total_price": order.total_price,
+            "status": order.status,
+            "address": order.address,
+            "phone": order.phone,
+            "items": items.get(order.id, []),
+        }
+        for order in orders
+    ]
+
+
+def reserve_cart_stock(db: Session, cart_id: int) -> list:
+    """
+    Проверяет и списывает остатки всех товаров корзины одним запросом.
+    Строки товаров блокируются по возрастанию id, чтобы параллельные оформления не взаимоблокировались.
+    Для каждого товара корзины возвращает строку; updated_id пуст, если товара нет или не хватает остатка
+    """
+    cart_item = models.CartItem
+    products = models.Product.__table__
+
+    req = (
+        select(cart_item.product_id, func.sum(cart_item.quantity).label("qty"))
+        .where(cart_item.cart_id == cart_id)
+        .group_by(cart_item.product_id)
+        .cte("req")
+    )
+    locked = (
+        select(products.c.id)
+        .join(req, req.c.product_id == products.c.id)
+        .order_by(products.c.id)
+        .with_for_update()
+        .cte("locked")
+    )
+    upd = (
+        update(products)
+        .where(
+            products.c.id == req.c.product_id,
+            products.c.id == locked.c.id,
+            products.c.quantity >= req.c.qty,
+        )
+        .values(quantity=products.c.quantity - req.c.qty)
+        .returning(
+            products.c.id,
+            products.c.name,
+            products.c.price,
+            products.c.category,
+            products.c.quantity,
+        )
+        .cte("upd")
+    )
+    current = products.alias("current")
+
+    return db.execute(
+        select(
+            req.c.product_id,
+            req.c.qty,
+            upd.c.id.label("updated_id"),
+            upd.c.name,
+            upd.c.price,
+            upd.c.category,
+            upd.c.quantity.label("quantity_after"),
+            current.c.id.label("existing_id"),
+            current.c.name.label("current_name"),
         )
-    my_orders = list(orders_dict.values())
-    return my_orders
+        .select_from(req)
+        .outerjoin(upd, upd.c.id == req.c.product_id)
+        .outerjoin(current, current.c.id == req.c.product_id)
+        .order_by(req.c.product_id)
+    ).all()
 
 
 @router.post("/", response_model=schemas.OrderBase, status_code=status.HTTP_201_CREATED)
@@ -192,104 +424,234 @@ def create_order(
     order_data: schemas.OrderCreate,
     db: Session = Depends(database.get_db),
     current_user: schemas.User = Depends(oauth2.get_current_user),
+    idempotency_key: str | None = Header(
+        None, description="Повтор с тем же ключом вернет уже созданный заказ"
+    ),
 ):
-    cart = db.query(models.Cart).filter(models.Cart.user_id == current_user.id).first()
+    if idempotency_key is not None:
+        replay = reserve_key(
+            db, current_user.id, "orders.create", idempotency_key, order_data
+        )
+        if replay is not None:
+            return replay
 
-    if not cart:
+    cart_id = db.execute(
+        select(models.Cart.id).where(models.Cart.user_id == current_user.id)
+    ).scalar()
+
+    if cart_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Корзина пуста"
         )
 
-    cart_items = (
-        db.query(models.CartItem).filter(models.CartItem.cart_id == cart.id).all()
-    )
-    if not cart_items:
+    reserved = reserve_cart_stock(db, cart_id)
+    if not reserved:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Список товаров в корзине пуст",
         )
 
-    total_price = 0
-    order_items_objects = []
-
-    for cart_item in cart_items:
-        product = (
-            db.query(models.Product)
-            .filter(models.Product.id == cart_item.product_id)
-            .first()
-        )
-        if not product:
+    for row in reserved:
+        if row.updated_id is not None:
+            continue
+        # Списание уже частично выполнено этим же запросом, откатываем его целиком
+        db.rollback()
+        if row.existing_id is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Товар с id {cart_item.product_id} не был найден",
-            )
-        if product.quantity < cart_item.quantity:  # type: ignore
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Недостаточно товара '{product.name}' на складе",
+                detail=f"Товар с id {row.product_id} не был найден",
             )
-        total_price += product.price * cart_item.quantity
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недостаточно товара '{row.current_name}' на складе",
+        )
 
-        order_item = models.OrderItem(
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity,
-            price=product.price,
+    total_price = sum(row.price * row.qty for row in reserved)
+    order = db.execute(
+        insert(models.Order)
+        .values(
+            user_id=current_user.id,
+            total_price=total_price,
+            address=order_data.address,
+            phone=order_data.phone,
         )
-        order_items_objects.append(order_item)
-        product.quantity -= cart_item.quantity  # type: ignore
-
-    new_order = models.Order(
-        user_id=current_user.id,
-        total_price=total_price,
-        items=order_items_objects,
-        address=order_data.address,
-        phone=order_data.phone,
+        .returning(models.Order.id, models.Order.created_at, models.Order.status)
+    ).one()
+
+    item_ids = db.execute(
+        insert(models.OrderItem).returning(
+            models.OrderItem.id, sort_by_parameter_order=True
+        ),
+        [
+            {
+                "order_id": order.id,
+                "product_id": row.product_id,
+                "quantity": row.qty,
+                "price": row.price,
+                "category": row.category,
+            }
+            for row in reserved
+        ],
+    ).scalars().all()
+
+    crud.apply_order_sales(db, [order.id])
+    crud.adjust_category_counts(
+        db,
+        before=[(row.category, row.quantity_after + row.qty) for row in reserved],
+        after=[(row.category, row.quantity_after) for row in reserved],
     )
-    db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
+    db.execute(delete(models.CartItem).where(models.CartItem.cart_id == cart_id))
 
-    order_with_items = (
-        db.query(models.Order).filter(models.Order.id == new_order.id).first()
-    )
+    # Ответ собирается из уже известных данных, без повторного чтения заказа
     order_response = {
-        "id": order_with_items.id,  # type: ignore
-        "created_at": order_with_items.created_at,  # type: ignore
-        "total_price": order_with_items.total_price,  # type: ignore
-        "status": order_with_items.status,  # type: ignore
-        "address": order_with_items.address,  # type: ignore
-        "phone": order_with_items.phone,  # type: ignore
-        "items": [],
+        "id": order.id,
+        "created_at": order.created_at,
+        "total_price": total_price,
+        "status": order.status,
+        "address": order_data.address,
+        "phone": order_data.phone,
+        "items": [
+            {
+                "id": item_id,
+                "product_id": row.product_id,
+                "name": row.name,
+                "price": row.price,
+                "quantity": row.qty,
+            }
+            for item_id, row in zip(item_ids, reserved)
+        ],
     }
-
-    # Загружаем информацию о товарах в заказе
-    order_items_with_products = (
-        db.query(models.OrderItem, models.Product)
-        .join(models.Product, models.Product.id == models.OrderItem.product_id)
-        .filter(models.OrderItem.order_id == new_order.id)
-        .all()
+    # Уведомления, аналитика и синхронизация со складом выполняются воркером после коммита
+    outbox.enqueue(
+        db, outbox.ORDER_CREATED, {**order_response, "user_id": current_user.id}
     )
+    if idempotency_key is not None:
+        save_response(
+            db,
+            current_user.id,
+            "orders.create",
+            idempotency_key,
+            status.HTTP_201_CREATED,
+            schemas.OrderBase.model_validate(order_response),
+        )
+    db.commit()
+    invalidate_products(*(row.product_id for row in reserved))
+    return order_response
 
-    for order_item, product in order_items_with_products:
-        order_response["items"].append(
-            {
-                "id": order_item.id,
-                "product_id": order_item.product_id,
-                "name": product.name,
-                "price": order_item.price,
-                "quantity": order_item.quantity,
-            }
+
+@router.patch("/status", response_model=schemas.OrderBulkStatusResult)
+def bulk_update_order_status(
+    payload: schemas.OrderBulkStatusUpdate,
+    db: Session = Depends(database.get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user),
+):
+    """
+    Переводит в новый статус список заказов или все заказы под фильтром одним UPDATE.
+    Заказы, для которых переход не разрешен ORDER_STATUS_TRANSITIONS, пропускаются и попадают в rejected
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Доступ запрещен: только администраторы могут обновлять статус заказа",
         )
 
-    # for order_item in new_order.items:
-    #     if not getattr(order_item, "product", None):
-    #         order_item.product = db.query(models.Product).filter(models.Product.id == order_item.product_id).first()
-    #     order_item.name = order_item.product.name if order_item.product else ""
-    #     order_item.description = order_item.product.description if order_item.product else ""
+    if payload.status not in crud.ORDER_STATUS_TRANSITIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недопустимый статус заказа: {payload.status}",
+        )
+    if (payload.ids is None) == (payload.filter is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Нужно передать либо ids, либо filter",
+        )
 
-    db.query(models.CartItem).filter(models.CartItem.cart_id == cart.id).delete()
+    orders = models.Order.__table__
+    if payload.ids is not None:
+        ids = list(dict.fromkeys(payload.ids))
+        if len(ids) > MAX_BULK_STATUS_ORDERS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"За один запрос можно обновить не более {MAX_BULK_STATUS_ORDERS} заказов",
+            )
+        conditions = [orders.c.id.in_(ids)]
+    else:
+        ids = None
+        conditions = []
+        order_filter = payload.filter
+        if order_filter.status is not None:  # type: ignore
+            conditions.append(orders.c.status == order_filter.status)  # type: ignore
+        if order_filter.user_id is not None:  # type: ignore
+            conditions.append(orders.c.user_id == order_filter.user_id)  # type: ignore
+        if order_filter.created_from is not None:  # type: ignore
+            conditions.append(orders.c.created_at >= order_filter.created_from)  # type: ignore
+        if order_filter.created_to is not None:  # type: ignore
+            conditions.append(orders.c.created_at < order_filter.created_to)  # type: ignore
+
+    allowed_from = [
+        source
+        for source in crud.ORDER_STATUS_TRANSITIONS
+        if crud.status_change_allowed(source, payload.status)
+    ]
+
+    # Заказы блокируются по возрастанию id, как и товары при оформлении.
+    # Лимит на единицу больше допустимого: так фильтр не захватит всю таблицу, а превышение видно
+    target = (
+        select(orders.c.id, orders.c.status)
+        .where(*conditions)
+        .order_by(orders.c.id)
+        .limit(MAX_BULK_STATUS_ORDERS + 1)
+        .with_for_update()
+        .cte("target")
+    )
+    upd = (
+        update(orders)
+        .where(orders.c.id == target.c.id, target.c.status.in_(allowed_from))
+        .values(status=payload.status)
+        .returning(orders.c.id)
+        .cte("upd")
+    )
+    rows = db.execute(
+        select(target.c.id, target.c.status, upd.c.id.label("updated_id"))
+        .select_from(target)
+        .outerjoin(upd, upd.c.id == target.c.id)
+        .order_by(target.c.id)
+    ).all()
+    if len(rows) > MAX_BULK_STATUS_ORDERS:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Под фильтр попадает больше {MAX_BULK_STATUS_ORDERS} заказов, сузьте его",
+        )
+
+    updated = [row.id for row in rows if row.updated_id is not None]
+    if payload.status == crud.ORDER_CANCELLED:
+        crud.apply_order_sales(db, updated, -1)
+    else:
+        crud.apply_order_sales(
+            db,
+            [
+                row.id
+                for row in rows
+                if row.updated_id is not None and row.status == crud.ORDER_CANCELLED
+            ],
+        )
     db.commit()
-    return order_response
+
+    found = {row.id for row in rows}
+    return {
+        "updated": updated,
+        "rejected": [
+            {
+                "id": row.id,
+                "status": row.status,
+                "detail": f"Переход из статуса '{row.status}' в '{payload.status}' не разрешен",
+            }
+            for row in rows
+            if row.updated_id is None
+        ],
+        "missing": [order_id for order_id in ids or [] if order_id not in found],
+    }
 
 
 @router.put("/{id}", response_model=schemas.OrderStatusUpdateResponse)
@@ -304,14 +666,34 @@ def update_order_status(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Доступ запрещен: только администраторы могут обновлять статус заказа",
         )
+    if updated_order.status not in models.ORDER_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недопустимый статус заказа: {updated_order.status}",
+        )
+
     order_query = db.query(models.Order).filter(models.Order.id == id)
-    order = order_query.first()
+    # Блокировка не дает двум параллельным сменам статуса дважды поправить итоги продаж
+    order = order_query.with_for_update().first()
 
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Заказ не найден"
         )
 
+    # Повторный PUT с тем же статусом ничего не меняет
+    if updated_order.status == order.status:
+        return order
+    if not crud.status_change_allowed(order.status, updated_order.status):  # type: ignore
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Переход из статуса '{order.status}' в '{updated_order.status}' не разрешен",
+        )
+
+    # Из отмененного заказа переходов нет, поэтому продажи можно только вычесть
+    if updated_order.status == crud.ORDER_CANCELLED:
+        crud.apply_order_sales(db, [id], -1)
+
     order_query.update(updated_order.model_dump(), synchronize_session=False)  # type: ignore
     db.commit()
     return order_query.first()
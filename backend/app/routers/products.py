@@ -1,23 +1,229 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Query, Body
-from sqlalchemy import asc, desc, func
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query, Body, Header
+from sqlalchemy import (
+    Float,
+    String,
+    case,
+    cast,
+    column,
+    func,
+    literal,
+    literal_column,
+    null,
+    or_,
+    select,
+    true,
+    union_all,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
 from sqlalchemy.orm import Session
-from .. import models, schemas, oauth2
+from .. import models, schemas, oauth2, crud
 from .. import database
-from typing import Optional
 from fastapi import Form, UploadFile, File
+import csv
 import os
-from uuid import uuid4
+import zipfile
 from ..services.supabase_client import upload_image_to_supabase
+from ..services.product_import import import_products
+from ..streaming import ndjson_response
+from ..idempotency import reserve_key, save_response
+from ..cache import (
+    cache_stats,
+    catalog_etag,
+    categories_cache,
+    etag_matches,
+    facets_cache,
+    invalidate_products,
+    invalidate_reviews,
+    product_cache,
+    not_modified,
+    product_list_cache,
+    reviews_cache,
+    set_catalog_headers,
+)
+from ..pagination import (
+    NEXT_CURSOR_HEADER,
+    TOTAL_COUNT_HEADER,
+    TOTAL_COUNT_MODES,
+    decode_cursor,
+    encode_cursor,
+    estimated_count,
+    exact_count,
+    keyset_after,
+    keyset_order,
+)
 
 ALLOWED_SORT_FIELDS = {"price", "name", "quantity"}
+RATING_SORT_FIELDS = {"average_rating", "reviews_count"}
+SEARCH_MODES = {"substring", "fulltext", "fuzzy"}
+MAX_BATCH_IDS = 300
+REVIEWS_PAGE_SIZE = 20
+MAX_REVIEWS_PAGE_SIZE = 100
+ADMIN_PAGE_SIZE = 50
+MAX_ADMIN_PAGE_SIZE = 500
+ADMIN_LIST_COLUMNS = (
+    models.Product.id,
+    models.Product.name,
+    models.Product.price,
+    models.Product.original_price,
+    models.Product.discount,
+    models.Product.image_url,
+    models.Product.quantity,
+    models.Product.category,
+)
+ADMIN_VIEWS = {
+    "full": (*ADMIN_LIST_COLUMNS, models.Product.description),
+    "list": ADMIN_LIST_COLUMNS,
+}
+BULK_UPDATE_FIELDS = ("price", "original_price", "discount", "quantity")
+MAX_BULK_UPDATE_ROWS = 10000
+BULK_UPDATE_CHUNK_SIZE = 1000
+SEARCH_CONFIG = literal_column("'russian'::regconfig")
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
 
+def product_search_vector():
+    """
+    Выражение должно совпадать с индексом ix_products_search_vector, иначе планировщик его не использует
+    """
+    return func.setweight(
+        func.to_tsvector(SEARCH_CONFIG, models.Product.name), literal_column("'A'")
+    ).op("||")(
+        func.setweight(
+            func.to_tsvector(SEARCH_CONFIG, func.coalesce(models.Product.description, "")),
+            literal_column("'B'"),
+        )
+    )
+
+
+def search_condition(search: str, search_mode: str):
+    if search_mode not in SEARCH_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недопустимый режим поиска: {search_mode}",
+        )
+
+    if search_mode == "fulltext":
+        return product_search_vector().op("@@")(
+            func.websearch_to_tsquery(SEARCH_CONFIG, search)
+        )
+    if search_mode == "fuzzy":
+        # word_similarity устойчив к опечаткам и обслуживается gin_trgm_ops индексами
+        return or_(
+            literal(search).op("<%")(models.Product.name),
+            literal(search).op("<%")(models.Product.description),
+        )
+    # ILIKE с ведущим % тоже обслуживается триграммным индексом по name
+    return models.Product.name.ilike(f"%{search}%")
+
+
+def product_filters(
+    search: str,
+    search_mode: str,
+    max_price: float | None,
+    min_price: float | None,
+    in_stock: bool | None,
+    categories: list[str] | None,
+    min_rating: float | None = None,
+    max_rating: float | None = None,
+) -> list:
+    """
+    Общие условия фильтрации каталога. Условия по рейтингу требуют join с product_ratings
+    """
+    conditions = []
+    if max_price is not None:
+        conditions.append(models.Product.price <= max_price)
+    if min_price is not None:
+        conditions.append(models.Product.price >= min_price)
+    if in_stock is True:
+        conditions.append(models.Product.quantity > 0)
+    if categories:
+        conditions.append(models.Product.category.in_(categories))
+    if min_rating is not None:
+        conditions.append(models.ProductRating.average_rating >= min_rating)
+    if max_rating is not None:
+        conditions.append(models.ProductRating.average_rating <= max_rating)
+    if search:
+        conditions.append(search_condition(search, search_mode))
+    return conditions
+
+
+def product_with_rating(product, average_rating, reviews_count) -> dict:
+    """
+    Отделяет данные от ORM-объекта, чтобы их можно было держать в кэше
+    """
+    return schemas.ProductWithRating.model_validate(
+        {
+            **product.__dict__,
+            "average_rating": round(average_rating, 2),
+            "reviews_count": reviews_count,
+        }
+    ).model_dump()
+
+
+def reviews_page(product_id: int, limit: int, cursor: str | None = None):
+    """
+    Страница отзывов от новых к старым: limit + 1 строк, лишняя строка означает, что есть следующая
+    """
+    review = models.ProductReview
+    query = (
+        select(
+            review.id,
+            review.product_id,
+            review.user_id,
+            review.rating,
+            review.created_at,
+        )
+        .where(review.product_id == product_id)
+        .order_by(*keyset_order(review.created_at, review.id, descending=True))
+        .limit(limit + 1)
+    )
+    if cursor:
+        last_created_at, last_id = decode_cursor(cursor, 2)
+        query = query.where(
+            keyset_after(review.created_at, review.id, last_created_at, last_id, True)
+        )
+    return query
+
+
+def reviews_next_cursor(reviews: list, limit: int) -> str | None:
+    if len(reviews) <= limit:
+        return None
+    del reviews[limit:]
+    return encode_cursor(reviews[-1]["created_at"], reviews[-1]["id"])
+
+
+def search_rank(search: str, search_mode: str):
+    # ts_rank и word_similarity возвращают real, приводим к double, чтобы значение из курсора сравнивалось точно
+    if search_mode == "fulltext":
+        rank = func.ts_rank(
+            product_search_vector(), func.websearch_to_tsquery(SEARCH_CONFIG, search)
+        )
+    else:
+        rank = func.word_similarity(search, models.Product.name)
+    return cast(rank, Float)
+
+
+def sort_expression(sort_by: str):
+    """
+    Выражение сортировки каталога. COALESCE с литералом 0 совпадает с индексом ix_products_quantity_id
+    """
+    if sort_by == "quantity":
+        return func.coalesce(models.Product.quantity, literal_column("0"))
+    return getattr(models.Product, sort_by)
+
+
 @router.get("/", response_model=list[schemas.ProductWithRating])
 def get_products(
+    request: Request,
+    response: Response,
     db: Session = Depends(database.get_db),
     search: str = Query("", description="Поиск по названию"),
+    search_mode: str = Query(
+        "substring", description="Режим поиска: substring, fulltext или fuzzy"
+    ),
     max_price: float | None = Query(
         None, ge=0, description="Фильтр по максимальной цене"
     ),
@@ -36,93 +242,201 @@ def get_products(
     sort_order: str = Query("desc", description="Порядок сортировки"),
     limit: int = Query(14, ge=1, le=100, description="Количество товаров на странице"),
     page: int = Query(1, ge=1, description="Номер страницы"),
+    cursor: str | None = Query(
+        None, description="Курсор следующей страницы из заголовка X-Next-Cursor"
+    ),
+    total: str | None = Query(
+        None, description="Вернуть X-Total-Count: exact или estimated"
+    ),
 ):
     if min_price is not None and max_price is not None and min_price > max_price:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="min_price не может быть больше max_price",
         )
-
-    conditions = []
-    if max_price is not None:
-        conditions.append(models.Product.price <= max_price)
-    if min_price is not None:
-        conditions.append(models.Product.price >= min_price)
-    if in_stock is True:
-        conditions.append(models.Product.quantity > 0)
-    if categories:
-        conditions.append(models.Product.category.in_(categories))
+    if total is not None and total not in TOTAL_COUNT_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недопустимый режим подсчета: {total}",
+        )
+    if search_mode not in SEARCH_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недопустимый режим поиска: {search_mode}",
+        )
 
     # query = db.query(models.Product).filter(
     #     models.Product.name.ilike(f"%{search}%"), *conditions
     # )
 
+    conditions = product_filters(
+        search,
+        search_mode,
+        max_price,
+        min_price,
+        in_stock,
+        categories,
+        min_rating,
+        max_rating,
+    )
+
+    if sort_by:
+        if sort_by not in ALLOWED_SORT_FIELDS | RATING_SORT_FIELDS | {"relevance"}:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Недопустимое поле сортировки: {sort_by}",
+            )
+        if sort_by == "relevance":
+            if not search:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Сортировка по релевантности требует поискового запроса",
+                )
+            sort_column = search_rank(search, search_mode)
+            id_column = models.Product.id
+        elif sort_by in RATING_SORT_FIELDS:
+            # Строка рейтинга есть у каждого товара, поэтому ключ страницы целиком берется
+            # из product_ratings и совпадает с индексами ix_product_ratings_*_id
+            sort_column = getattr(models.ProductRating, sort_by)
+            id_column = models.ProductRating.product_id
+        else:
+            # Сравнение кортежей с NULL не дает ни true, ни false и теряет строки на границе страниц,
+            # поэтому остаток сортируется по COALESCE
+            sort_column = sort_expression(sort_by)
+            id_column = models.Product.id
+        descending = sort_order != "asc"
+    else:
+        sort_column = id_column = models.Product.id
+        descending = False
+
+    if cursor:
+        cursor_sort, cursor_descending, last_value, last_id = decode_cursor(cursor, 4)
+        if cursor_sort != (sort_by or "id") or cursor_descending != descending:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Курсор не соответствует параметрам сортировки",
+            )
+
+    # Условный ответ только после проверки параметров: некорректный запрос не должен получать 304.
+    # Ключ собирается из нормализованных значений, чтобы равнозначные запросы делили ETag и кэш
+    cache_key = (
+        search,
+        search_mode if search else None,
+        max_price,
+        min_price,
+        min_rating,
+        max_rating,
+        in_stock,
+        tuple(sorted(set(categories or []))),
+        sort_by or "id",
+        descending,
+        limit,
+        cursor or page,
+        total,
+    )
+    etag = catalog_etag("products", cache_key)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_catalog_headers(response, etag)
+
+    cached = product_list_cache.get(cache_key)
+    if cached is not None:
+        result, next_cursor, total_count = cached
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        if total_count is not None:
+            response.headers[TOTAL_COUNT_HEADER] = str(total_count)
+        return result
+    cache_generation = product_list_cache.generation
+
     query = (
         db.query(
             models.Product,
-            func.coalesce(func.avg(models.ProductReview.rating), 0).label(
+            func.coalesce(models.ProductRating.average_rating, 0).label(
                 "average_rating"
             ),
-            func.count(models.ProductReview.id).label("reviews_count"),
+            func.coalesce(models.ProductRating.reviews_count, 0).label(
+                "reviews_count"
+            ),
+            sort_column.label("sort_value"),
         )
-        .outerjoin(
-            models.ProductReview, models.Product.id == models.ProductReview.product_id
+        .join(
+            models.ProductRating,
+            models.Product.id == models.ProductRating.product_id,
         )
-        .filter(models.Product.name.ilike(f"%{search}%"), *conditions)
-        .group_by(models.Product.id)
+        .filter(*conditions)
     )
 
-    if min_rating is not None:
-        query = query.having(
-            func.coalesce(func.avg(models.ProductReview.rating), 0) >= min_rating
-        )
-    if max_rating is not None:
-        query = query.having(
-            func.coalesce(func.avg(models.ProductReview.rating), 0) <= max_rating
-        )
+    query = query.order_by(*keyset_order(sort_column, id_column, descending))
 
-    if sort_by:
-        if sort_by not in ALLOWED_SORT_FIELDS | {"average_rating", "reviews_count"}:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Недопустимое поле сортировки: {sort_by}",
-            )
-        sort_column = (
-            sort_by
-            if sort_by in {"average_rating", "reviews_count"}
-            else getattr(models.Product, sort_by)
-        )
-        query = query.order_by(
-            asc(sort_column) if sort_order == "asc" else desc(sort_column)
-        )
+    # Точное число для обычных страниц считает оконная функция в том же запросе
+    window_count = total == "exact" and not cursor
+    if window_count:
+        query = query.add_columns(func.count().over().label("total_count"))
 
+    if cursor:
+        query = query.filter(
+            keyset_after(sort_column, id_column, last_value, last_id, descending)
+        )
     else:
-        query = query.order_by(models.Product.id)
+        query = query.offset((page - 1) * limit)
 
     # products = query.all()
 
-    offset = (page - 1) * limit
-    products = query.offset(offset).limit(limit).all()
-
-    result = []
-    for product, avg_rating, reviews_count in products:
-        result.append(
-            {
-                **product.__dict__,
-                "average_rating": round(avg_rating, 2),
-                "reviews_count": reviews_count,
-            }
+    products = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        last_row = products[-1]
+        next_cursor = encode_cursor(
+            sort_by or "id", descending, last_row.sort_value, last_row.Product.id
         )
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    total_count = None
+    if total:
+        count_query = (
+            db.query(models.Product.id)
+            .join(
+                models.ProductRating,
+                models.Product.id == models.ProductRating.product_id,
+            )
+            .filter(*conditions)
+            .statement
+        )
+        if total == "estimated":
+            total_count = estimated_count(db, count_query)
+        elif window_count and products:
+            total_count = products[0].total_count
+        else:
+            total_count = exact_count(db, count_query)
+        response.headers[TOTAL_COUNT_HEADER] = str(total_count)
+
+    result = [
+        product_with_rating(row.Product, row.average_rating, row.reviews_count)
+        for row in products
+    ]
+    product_list_cache.set(
+        cache_key, (result, next_cursor, total_count), cache_generation
+    )
 
     # return products
     return result
 
 
-@router.get("/admin", response_model=list[schemas.Product])
+@router.get(
+    "/admin",
+    response_model=list[schemas.ProductAdminItem],
+    response_model_exclude_unset=True,
+)
 def get_products_for_admin(
+    response: Response,
     db: Session = Depends(database.get_db),
     current_user: schemas.User = Depends(oauth2.get_current_user),
     search: str = Query("", description="Поиск по названию"),
+    search_mode: str = Query(
+        "substring", description="Режим поиска: substring, fulltext или fuzzy"
+    ),
     max_price: float | None = Query(
         None, ge=0, description="Фильтр по максимальной цене"
     ),
@@ -133,6 +447,17 @@ def get_products_for_admin(
     categories: list[str] = Query(None, description="Фильтр по категориям"),
     sort_by: str | None = Query(None, description="Поле для сортировки"),
     sort_order: str = Query("desc", description="Порядок сортировки"),
+    view: str = Query("full", description="full или list (без описания)"),
+    limit: int = Query(
+        ADMIN_PAGE_SIZE,
+        ge=1,
+        le=MAX_ADMIN_PAGE_SIZE,
+        description="Количество товаров на странице",
+    ),
+    cursor: str | None = Query(
+        None, description="Курсор следующей страницы из заголовка X-Next-Cursor"
+    ),
+    stream: bool = Query(False, description="Отдать результат потоком NDJSON"),
 ):
     if current_user.role != "admin":
         raise HTTPException(
@@ -146,19 +471,11 @@ def get_products_for_admin(
             detail="min_price не может быть больше max_price",
         )
 
-    conditions = []
-    if max_price is not None:
-        conditions.append(models.Product.price <= max_price)
-    if min_price is not None:
-        conditions.append(models.Product.price >= min_price)
-    if in_stock is True:
-        conditions.append(models.Product.quantity > 0)
-    if categories:
-        conditions.append(models.Product.category.in_(categories))
-
-    query = db.query(models.Product).filter(
-        models.Product.name.ilike(f"%{search}%"), *conditions
-    )
+    if view not in ADMIN_VIEWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недопустимый вид списка: {view}",
+        )
 
     if sort_by:
         if sort_by not in ALLOWED_SORT_FIELDS:
@@ -166,59 +483,430 @@ def get_products_for_admin(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Недопустимое поле сортировки: {sort_by}",
             )
-        sort_column = getattr(models.Product, sort_by)
-        query = query.order_by(
-            asc(sort_column) if sort_order == "asc" else desc(sort_column)
+        sort_column = sort_expression(sort_by)
+        descending = sort_order != "asc"
+    else:
+        sort_column = models.Product.id
+        descending = False
+
+    # Выбираем только нужные колонки: в виде list большое описание не читается из БД
+    conditions = product_filters(
+        search, search_mode, max_price, min_price, in_stock, categories
+    )
+    query = (
+        select(*ADMIN_VIEWS[view], sort_column.label("sort_value"))
+        .where(*conditions)
+        .order_by(*keyset_order(sort_column, models.Product.id, descending))
+    )
+
+    if cursor:
+        cursor_sort, cursor_descending, last_value, last_id = decode_cursor(cursor, 4)
+        if cursor_sort != (sort_by or "id") or cursor_descending != descending:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Курсор не соответствует параметрам сортировки",
+            )
+        query = query.where(
+            keyset_after(
+                sort_column, models.Product.id, last_value, last_id, descending
+            )
         )
 
-    else:
-        query = query.order_by(models.Product.id)
+    if stream:
+        return ndjson_response(query.with_only_columns(*ADMIN_VIEWS[view]))
+
+    rows = db.execute(query.limit(limit + 1)).mappings().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            sort_by or "id", descending, rows[-1]["sort_value"], rows[-1]["id"]
+        )
 
-    products = query.all()
-    return products
+    return [dict(row) for row in rows]
 
 
 @router.get("/categories", response_model=list[dict])
-def get_categories(db: Session = Depends(database.get_db)):
+def get_categories(
+    request: Request,
+    response: Response,
+    db: Session = Depends(database.get_db),
+):
+    etag = catalog_etag("categories")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_catalog_headers(response, etag)
+
+    cached = categories_cache.get("all")
+    if cached is not None:
+        return cached
+    cache_generation = categories_cache.generation
+
+    # Счетчики поддерживаются при записи товаров и заказов, см. crud.adjust_category_counts
     query = (
-        db.query(models.Product.category, func.count(models.Product.id).label("count"))
-        .group_by(models.Product.category)
+        db.query(models.CategoryCount)
+        .filter(models.CategoryCount.total > 0)
+        .order_by(models.CategoryCount.category)
         .all()
     )
 
-    return [{"name": c[0], "count": c[1]} for c in query]
+    categories = [
+        {"name": c.category, "count": c.total, "in_stock": c.in_stock} for c in query
+    ]
+    categories_cache.set("all", categories, cache_generation)
+    return categories
+
+
+@router.get("/facets", response_model=schemas.ProductFacets)
+def get_product_facets(
+    db: Session = Depends(database.get_db),
+    search: str = Query("", description="Поиск по названию"),
+    search_mode: str = Query(
+        "substring", description="Режим поиска: substring, fulltext или fuzzy"
+    ),
+    max_price: float | None = Query(
+        None, ge=0, description="Фильтр по максимальной цене"
+    ),
+    min_price: float | None = Query(
+        None, ge=0, description="Фильтр по минимальной цене"
+    ),
+    min_rating: float | None = Query(
+        None, ge=0, le=5, description="Минимальный рейтинг"
+    ),
+    max_rating: float | None = Query(
+        None, ge=0, le=5, description="Максимальный рейтинг"
+    ),
+    in_stock: bool = Query(True, description="Фильтр по наличию товара"),
+    categories: list[str] = Query(None, description="Фильтр по категориям"),
+    price_buckets: int = Query(
+        5, ge=1, le=20, description="Количество ценовых диапазонов"
+    ),
+):
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_price не может быть больше max_price",
+        )
+
+    cache_key = (
+        search,
+        search_mode,
+        max_price,
+        min_price,
+        min_rating,
+        max_rating,
+        in_stock,
+        tuple(sorted(set(categories or []))),
+        price_buckets,
+    )
+    cached = facets_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    cache_generation = facets_cache.generation
+
+    # Счетчики категорий строятся без фильтра по категориям, чтобы были видны и невыбранные
+    conditions = product_filters(
+        search,
+        search_mode,
+        max_price,
+        min_price,
+        in_stock,
+        None,
+        min_rating,
+        max_rating,
+    )
+    selected = models.Product.category.in_(categories) if categories else true()
+
+    base = (
+        select(
+            models.Product.category,
+            models.Product.price,
+            func.coalesce(models.ProductRating.average_rating, 0).label("rating"),
+            selected.label("selected"),
+        )
+        .outerjoin(
+            models.ProductRating,
+            models.Product.id == models.ProductRating.product_id,
+        )
+        .where(*conditions)
+        .cte("base")
+    )
+    bounds = (
+        select(
+            func.min(base.c.price).label("low"), func.max(base.c.price).label("high")
+        )
+        .where(base.c.selected)
+        .cte("bounds")
+    )
+    price_bucket = case(
+        (bounds.c.high == bounds.c.low, 0),
+        else_=func.least(
+            func.floor(
+                (base.c.price - bounds.c.low)
+                / ((bounds.c.high - bounds.c.low) / price_buckets)
+            ),
+            price_buckets - 1,
+        ),
+    )
+    no_name = cast(null(), String)
+    no_number = cast(null(), Float)
+
+    facets_query = union_all(
+        select(
+            literal("category").label("facet"),
+            base.c.category.label("name"),
+            no_number.label("bucket"),
+            func.count().label("count"),
+            no_number.label("low"),
+            no_number.label("high"),
+        ).group_by(base.c.category),
+        select(
+            literal("price"),
+            no_name,
+            cast(price_bucket, Float),
+            func.count(),
+            bounds.c.low,
+            bounds.c.high,
+        )
+        .select_from(base.join(bounds, true()))
+        .where(base.c.selected)
+        .group_by(price_bucket, bounds.c.low, bounds.c.high),
+        select(
+            literal("rating"),
+            no_name,
+            cast(func.floor(base.c.rating), Float),
+            func.count(),
+            no_number,
+            no_number,
+        )
+        .where(base.c.selected)
+        .group_by(func.floor(base.c.rating)),
+    )
+
+    facets = {"total": 0, "categories": [], "price": [], "ratings": []}
+    for facet, name, bucket, count, low, high in db.execute(facets_query):
+        if facet == "category":
+            facets["categories"].append({"name": name, "count": count})
+        elif facet == "price":
+            step = (high - low) / price_buckets
+            is_last = step == 0 or bucket == price_buckets - 1
+            facets["total"] += count
+            facets["price"].append(
+                {
+                    "min_price": low + bucket * step,
+                    "max_price": high if is_last else low + (bucket + 1) * step,
+                    "count": count,
+                }
+            )
+        else:
+            facets["ratings"].append({"rating": int(bucket), "count": count})
+
+    facets["categories"].sort(key=lambda facet: facet["name"])
+    facets["price"].sort(key=lambda facet: facet["min_price"])
+    facets["ratings"].sort(key=lambda facet: facet["rating"])
+
+    facets_cache.set(cache_key, facets, cache_generation)
+    return facets
+
+
+@router.get("/batch", response_model=schemas.ProductBatch)
+def get_products_batch(
+    ids: list[int] = Query(..., description="Идентификаторы товаров"),
+    db: Session = Depends(database.get_db),
+):
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Можно запросить не более {MAX_BATCH_IDS} товаров за раз",
+        )
+
+    # Карточки берутся из общего кэша, в БД уходит один запрос только за недостающими
+    products = {}
+    for product_id in ids:
+        cached = product_cache.get(product_id)
+        if cached is not None:
+            products[product_id] = cached
+
+    not_cached = [product_id for product_id in ids if product_id not in products]
+    if not_cached:
+        cache_generation = product_cache.generation
+        rows = (
+            db.query(
+                models.Product,
+                func.coalesce(models.ProductRating.average_rating, 0).label(
+                    "average_rating"
+                ),
+                func.coalesce(models.ProductRating.reviews_count, 0).label(
+                    "reviews_count"
+                ),
+            )
+            .outerjoin(
+                models.ProductRating,
+                models.Product.id == models.ProductRating.product_id,
+            )
+            .filter(models.Product.id.in_(not_cached))
+            .all()
+        )
+        for row in rows:
+            product = product_with_rating(*row)
+            products[product["id"]] = product
+            product_cache.set(product["id"], product, cache_generation)
+
+    return {
+        "items": [products[product_id] for product_id in ids if product_id in products],
+        "missing": [product_id for product_id in ids if product_id not in products],
+    }
+
+
+@router.get("/cache/stats")
+def get_cache_stats(
+    current_user: schemas.User = Depends(oauth2.get_current_user),
+):
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Доступ запрещен: только администраторы могут получать статистику",
+        )
+
+    return cache_stats()
 
 
 @router.get("/{id}", response_model=schemas.ProductBase)
-def get_product(id: int, db: Session = Depends(database.get_db)):
+def get_product(
+    id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(database.get_db),
+):
     # product = db.query(models.Product).filter(models.Product.id == id).first()
 
-    product_with_rating = (
+    etag = catalog_etag("product", id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    cached = product_cache.get(id)
+    if cached is not None:
+        set_catalog_headers(response, etag)
+        return cached
+    cache_generation = product_cache.generation
+
+    row = (
         db.query(
             models.Product,
-            func.coalesce(func.avg(models.ProductReview.rating), 0).label(
+            func.coalesce(models.ProductRating.average_rating, 0).label(
                 "average_rating"
             ),
+            func.coalesce(models.ProductRating.reviews_count, 0).label(
+                "reviews_count"
+            ),
         )
         .outerjoin(
-            models.ProductReview, models.Product.id == models.ProductReview.product_id
+            models.ProductRating,
+            models.Product.id == models.ProductRating.product_id,
         )
         .filter(models.Product.id == id)
-        .group_by(models.Product.id)
         .first()
     )
 
-    if not product_with_rating:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Товар с id: {id} не был найден",
         )
 
-    product, avg_rating = product_with_rating
-    return {**product.__dict__, "average_rating": round(avg_rating, 2)}
+    product = product_with_rating(*row)
+    product_cache.set(id, product, cache_generation)
+    set_catalog_headers(response, etag)
+    return product
     # return product
 
 
+@router.get("/{id}/full", response_model=schemas.ProductFull)
+def get_product_full(
+    id: int,
+    request: Request,
+    response: Response,
+    reviews_limit: int = Query(
+        REVIEWS_PAGE_SIZE,
+        ge=1,
+        le=MAX_REVIEWS_PAGE_SIZE,
+        description="Размер первой страницы отзывов",
+    ),
+    db: Session = Depends(database.get_db),
+):
+    """
+    Все данные страницы товара одним запросом к БД: товар, рейтинг, гистограмма оценок
+    и первая страница отзывов. Следующие страницы отдает /{id}/reviews по next_cursor
+    """
+    etag = catalog_etag("product_full", id, reviews_limit)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    page = reviews_page(id, reviews_limit).subquery("page")
+    reviews_json = (
+        select(
+            func.coalesce(
+                func.json_agg(
+                    aggregate_order_by(
+                        func.json_build_object(
+                            "id", page.c.id,
+                            "product_id", page.c.product_id,
+                            "user_id", page.c.user_id,
+                            "rating", page.c.rating,
+                            "created_at", page.c.created_at,
+                        ),
+                        page.c.created_at.desc(),
+                        page.c.id.desc(),
+                    )
+                ),
+                literal_column("'[]'::json"),
+            )
+        )
+        .select_from(page)
+        .scalar_subquery()
+    )
+
+    rating = models.ProductRating
+    row = (
+        db.query(
+            models.Product,
+            func.coalesce(rating.average_rating, 0).label("average_rating"),
+            func.coalesce(rating.reviews_count, 0).label("reviews_count"),
+            *[
+                func.coalesce(getattr(rating, f"rating_{star}"), 0).label(f"rating_{star}")
+                for star in crud.RATING_STARS
+            ],
+            reviews_json.label("reviews"),
+        )
+        .outerjoin(rating, models.Product.id == rating.product_id)
+        .filter(models.Product.id == id)
+        .first()
+    )
+
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Товар с id: {id} не был найден",
+        )
+
+    reviews = row.reviews
+    next_cursor = reviews_next_cursor(reviews, reviews_limit)
+    set_catalog_headers(response, etag)
+    return {
+        "product": schemas.Product.model_validate(row.Product, from_attributes=True),
+        "rating": {
+            "average_rating": row.average_rating,
+            "reviews_count": row.reviews_count,
+            "histogram": [
+                {"rating": star, "count": getattr(row, f"rating_{star}")}
+                for star in crud.RATING_STARS
+            ],
+        },
+        "reviews": reviews,
+        "next_cursor": next_cursor,
+    }
+
+
 @router.post("/", response_model=schemas.Product, status_code=status.HTTP_201_CREATED)
 def create_product(
     name: str = Form(...),
@@ -272,14 +960,142 @@ def create_product(
         quantity=quantity,
         category=category,
         image_url=image_url,
+        rating=models.ProductRating(),
     )
 
     db.add(new_product)
+    crud.adjust_category_counts(db, after=[(category, quantity)])
     db.commit()
     db.refresh(new_product)
+    invalidate_products()
     return new_product
 
 
+@router.post("/import", response_model=schemas.ProductImportResult)
+def import_products_from_file(
+    file: UploadFile = File(...),
+    images: UploadFile | None = File(None),
+    db: Session = Depends(database.get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user),
+):
+    """
+    Массовая загрузка товаров из CSV или NDJSON. Строки с id обновляют существующие товары,
+    без id создают новые. В колонке image можно указать имя файла из zip-архива images
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Доступ запрещен: только администраторы могут импортировать товары",
+        )
+
+    filename = (file.filename or "").lower()
+    if not filename.endswith((".csv", ".ndjson", ".jsonl", ".json")):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Поддерживаются только файлы CSV и NDJSON",
+        )
+    if images is not None and not (images.filename or "").lower().endswith(".zip"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Изображения должны быть переданы zip-архивом",
+        )
+
+    try:
+        result = import_products(
+            db, file.file, filename, images.file if images is not None else None
+        )
+    except (UnicodeDecodeError, zipfile.BadZipFile, csv.Error) as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не удалось прочитать файл: {e}",
+        )
+    db.commit()
+
+    if result["inserted"] or result["updated"]:
+        invalidate_products(*result["updated_ids"])
+    return result
+
+
+@router.patch("/bulk", response_model=schemas.ProductBulkUpdateResult)
+def bulk_update_products(
+    items: list[schemas.ProductBulkUpdateItem] = Body(...),
+    db: Session = Depends(database.get_db),
+    current_user: schemas.User = Depends(oauth2.get_current_user),
+):
+    """
+    Массовое обновление цен и остатков. Меняются только переданные поля,
+    строки с одинаковым набором полей применяются одним UPDATE ... FROM (VALUES ...)
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Доступ запрещен: только администраторы могут обновлять товары",
+        )
+
+    if len(items) > MAX_BULK_UPDATE_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"За один запрос можно обновить не более {MAX_BULK_UPDATE_ROWS} товаров",
+        )
+
+    groups: dict[tuple, list] = {}
+    seen_ids = set()
+    for item in items:
+        if item.id in seen_ids:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Товар с id {item.id} указан несколько раз",
+            )
+        seen_ids.add(item.id)
+
+        fields = tuple(f for f in BULK_UPDATE_FIELDS if f in item.model_fields_set)
+        if not fields:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Для товара с id {item.id} не указано ни одного поля",
+            )
+        groups.setdefault(fields, []).append(item)
+
+    table = models.Product.__table__
+    updated_ids = []
+    for fields, group in groups.items():
+        for start in range(0, len(group), BULK_UPDATE_CHUNK_SIZE):
+            chunk = group[start : start + BULK_UPDATE_CHUNK_SIZE]
+            rows = values(
+                *(column(name, table.c[name].type) for name in ("id", *fields)),
+                name="bulk_rows",
+            ).data([(item.id, *(getattr(item, f) for f in fields)) for item in chunk])
+            updated_ids += db.execute(
+                update(models.Product)
+                .where(models.Product.id == rows.c.id)
+                # Колонка VALUES из одних NULL получает тип text, поэтому приводим явно
+                .values({f: cast(rows.c[f], table.c[f].type) for f in fields})
+                .returning(models.Product.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+
+    if updated_ids and any("quantity" in fields for fields in groups):
+        crud.recount_categories(
+            db,
+            db.execute(
+                select(models.Product.category)
+                .where(models.Product.id.in_(updated_ids))
+                .distinct()
+            ).scalars(),
+        )
+    db.commit()
+
+    if updated_ids:
+        invalidate_products(*updated_ids)
+
+    updated = set(updated_ids)
+    return {
+        "updated": sorted(updated),
+        "missing": [item.id for item in items if item.id not in updated],
+    }
+
+
 @router.put("/{id}", response_model=schemas.Product)
 def update_product(
     id: int,
@@ -340,8 +1156,21 @@ def update_product(
 
         update_data["image_url"] = upload_image_to_supabase(image.file, image.filename)
 
+    # Состояние "до" перечитываем под блокировкой строки, как при оформлении заказа: иначе
+    # параллельное списание между чтением и записью сбило бы category_counts.
+    # Блокировка берется после загрузки изображения, чтобы не держать ее во время сетевого вызова
+    product = product_query.with_for_update().populate_existing().first()
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Товар с id: {id} не был найден",
+        )
+    crud.adjust_category_counts(
+        db, before=[(product.category, product.quantity)], after=[(category, quantity)]
+    )
     product_query.update(update_data, synchronize_session=False)  # type: ignore
     db.commit()
+    invalidate_products(id)
 
     return product_query.first()
 
@@ -359,7 +1188,7 @@ def delete_product(
         )
 
     product_query = db.query(models.Product).filter(models.Product.id == id)
-    product = product_query.first()
+    product = product_query.with_for_update().first()
 
     if product == None:
         raise HTTPException(
@@ -367,8 +1196,11 @@ def delete_product(
             detail=f"Товар с id: {id} не существует",
         )
 
+    crud.adjust_category_counts(db, before=[(product.category, product.quantity)])
     product_query.delete(synchronize_session=False)
     db.commit()
+    invalidate_products(id)
+    reviews_cache.pop(id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -377,53 +1209,99 @@ def add_to_cart(
     payload: schemas.CartAdd = Body(...),
     db: Session = Depends(database.get_db),
     current_user: schemas.User = Depends(oauth2.get_current_user),
+    idempotency_key: str | None = Header(
+        None, description="Повтор с тем же ключом не добавит товар второй раз"
+    ),
 ):
-    print(payload)
-    product_id = payload.product_id
-    quantity = payload.quantity
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not product:
+    if idempotency_key is not None:
+        replay = reserve_key(db, current_user.id, "cart.add", idempotency_key, payload)
+        if replay is not None:
+            return replay
+
+    products = models.Product.__table__
+    carts = models.Cart.__table__
+    cart_items = models.CartItem.__table__
+
+    # Создание корзины и добавление позиции выполняются одним запросом.
+    # Уникальные ключи корзины и позиции не дают параллельным запросам создать дубли
+    product = (
+        select(
+            products.c.id,
+            products.c.name,
+            products.c.price,
+            products.c.image_url,
+            func.coalesce(products.c.quantity, 0).label("stock"),
+        )
+        .where(products.c.id == payload.product_id)
+        .cte("product")
+    )
+    cart_insert = insert(carts).from_select(
+        ["user_id"], select(literal(current_user.id)).select_from(product)
+    )
+    cart = (
+        cart_insert.on_conflict_do_update(
+            constraint="uq_cart_user_id",
+            set_={"user_id": cart_insert.excluded.user_id},
+        )
+        .returning(carts.c.id)
+        .cte("cart")
+    )
+    item_insert = insert(cart_items).from_select(
+        ["cart_id", "product_id", "quantity", "price"],
+        select(cart.c.id, product.c.id, literal(payload.quantity), product.c.price)
+        .select_from(cart.join(product, true())),
+    )
+    item = (
+        item_insert.on_conflict_do_update(
+            constraint="uq_cart_items_cart_id_product_id",
+            set_={"quantity": cart_items.c.quantity + item_insert.excluded.quantity},
+        )
+        .returning(cart_items.c.id, cart_items.c.quantity, cart_items.c.price)
+        .cte("item")
+    )
+    # Как и в PATCH /cart, остаток сравнивается с итоговым количеством в корзине, а не с добавкой.
+    # Позиция заблокирована upsert-ом, поэтому параллельные добавления не превысят остаток вместе
+    row = db.execute(
+        select(
+            (item.c.quantity <= product.c.stock).label("in_stock"),
+            product.c.name,
+            product.c.image_url,
+            item.c.id,
+            item.c.quantity,
+            item.c.price,
+        ).select_from(product.outerjoin(item, true()))
+    ).first()
+
+    if row is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Товар с id: {product_id} не найден",
+            detail=f"Товар с id: {payload.product_id} не найден",
         )
 
-    if product.quantity < quantity:  # type: ignore
+    if not row.in_stock:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Недостаточно товара на складе",
         )
 
-    cart = db.query(models.Cart).filter(models.Cart.user_id == current_user.id).first()
-    if not cart:
-        cart = models.Cart(user_id=current_user.id)
-        db.add(cart)
-        db.commit()
-        db.refresh(cart)
-
-    cart_item = (
-        db.query(models.CartItem)
-        .filter(
-            models.CartItem.cart_id == cart.id, models.CartItem.product_id == product_id
-        )
-        .first()
+    cart_item_data = schemas.CartItemBase(
+        id=row.id,
+        name=row.name,
+        price=row.price,
+        quantity=row.quantity,
+        image_url=row.image_url,
     )
-
-    if cart_item:
-        cart_item.quantity += quantity  # type: ignore
-    else:
-        cart_item = models.CartItem(
-            cart_id=cart.id,
-            product_id=product_id,
-            quantity=quantity,
-            price=product.price,
+    if idempotency_key is not None:
+        save_response(
+            db,
+            current_user.id,
+            "cart.add",
+            idempotency_key,
+            status.HTTP_201_CREATED,
+            cart_item_data,
         )
-        db.add(cart_item)
-
     db.commit()
-    db.refresh(cart_item)
-
-    cart_item_data = schemas.CartItemBase(id=cart_item.id, name=product.name, price=cart_item.price, quantity=cart_item.quantity, image_url=product.image_url)  # type: ignore
     return cart_item_data
 
 
@@ -465,8 +1343,10 @@ def create_review(
         rating=review.rating,
     )
     db.add(new_review)
+    crud.add_rating(db, product_id, review.rating)
     db.commit()
     db.refresh(new_review)
+    invalidate_reviews(product_id)
 
     return new_review
 
@@ -474,18 +1354,44 @@ def create_review(
 @router.get("/{product_id}/reviews", response_model=list[schemas.ReviewResponse])
 def get_reviews_for_product(
     product_id: int,
+    response: Response,
+    limit: int = Query(
+        REVIEWS_PAGE_SIZE, ge=1, le=MAX_REVIEWS_PAGE_SIZE, description="Размер страницы"
+    ),
+    cursor: str | None = Query(
+        None, description="Курсор следующей страницы из заголовка X-Next-Cursor"
+    ),
     db: Session = Depends(database.get_db),
 ):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not product:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Товар с id={product_id} не найден",
-        )
+    # Кэшируются только первые страницы: на них приходится почти весь трафик
+    pages = {} if cursor else reviews_cache.get(product_id) or {}
+    cached = pages.get(limit)
+    if cached is not None:
+        reviews, next_cursor = cached
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return reviews
+    cache_generation = reviews_cache.generation
+
+    reviews = [
+        schemas.ReviewResponse.model_validate(row).model_dump()
+        for row in db.execute(reviews_page(product_id, limit, cursor)).mappings()
+    ]
+
+    # Существование товара проверяем отдельно, только если отзывов нет
+    if not reviews and not cursor:
+        product = db.query(models.Product.id).filter(models.Product.id == product_id).first()
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Товар с id={product_id} не найден",
+            )
 
-    reviews = (
-        db.query(models.ProductReview)
-        .filter(models.ProductReview.product_id == product_id)
-        .all()
-    )
+    next_cursor = reviews_next_cursor(reviews, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if not cursor:
+        reviews_cache.set(
+            product_id, {**pages, limit: (reviews, next_cursor)}, cache_generation
+        )
     return reviews
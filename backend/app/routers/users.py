@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from .. import models, schemas, utils, oauth2
+from .. import models, schemas, utils, oauth2, crud
 from .. import database
+from ..cache import invalidate_reviews
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -209,8 +210,11 @@ def delete_user_profile(
             detail=f"Пользователь с id: {current_user.id} не был найден",
         )
 
+    rated_product_ids = crud.remove_user_ratings(db, current_user.id)
     user_query.delete(synchronize_session=False)
     db.commit()
+    if rated_product_ids:
+        invalidate_reviews(*rated_product_ids)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -235,6 +239,9 @@ def delete_user_by_admin(
             detail=f"Пользователь с id: {id} не был найден",
         )
 
+    rated_product_ids = crud.remove_user_ratings(db, id)
     user_query.delete(synchronize_session=False)
     db.commit()
+    if rated_product_ids:
+        invalidate_reviews(*rated_product_ids)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,39 @@
+"""
+Пересборка дневных итогов продаж sales_daily:
+
+    python -m app.sales_rollup                     # пересчитать все дни
+    python -m app.sales_rollup --since 2026-01-01  # пересчитать дни начиная с даты
+"""
+
+import argparse
+import sys
+from datetime import date
+from . import crud, database
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Пересборка таблицы sales_daily")
+    parser.add_argument(
+        "--since",
+        type=date.fromisoformat,
+        default=None,
+        help="первый пересчитываемый день в формате ГГГГ-ММ-ДД",
+    )
+    args = parser.parse_args(argv)
+
+    db = database.SessionLocal()
+    try:
+        crud.rebuild_sales(db, args.since)
+        db.commit()
+    finally:
+        db.close()
+
+    if args.since:
+        print(f"Итоги продаж пересчитаны начиная с {args.since}")
+    else:
+        print("Итоги продаж пересчитаны полностью")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,13 @@
-from pydantic import BaseModel, conint, EmailStr
-from datetime import datetime
+from pydantic import (
+    BaseModel,
+    confloat,
+    conint,
+    EmailStr,
+    field_validator,
+    model_validator,
+)
+from datetime import date, datetime
+from typing import Literal
 
 
 class User(BaseModel):
@@ -78,6 +86,93 @@ class ProductWithRating(ProductBase):
     reviews_count: int | None = None
 
 
+class ProductAdminItem(BaseModel):
+    id: int
+    name: str
+    description: str | None = None
+    price: float
+    original_price: float | None = None
+    discount: float | None = None
+    image_url: str | None = None
+    quantity: int | None = None
+    category: str
+
+
+class ProductBatch(BaseModel):
+    items: list[ProductWithRating]
+    missing: list[int]
+
+
+class ProductImportRow(BaseModel):
+    id: int | None = None
+    name: str
+    description: str | None = None
+    price: confloat(ge=0)  # type: ignore
+    original_price: confloat(ge=0) | None = None  # type: ignore
+    discount: float | None = None
+    quantity: conint(ge=0)  # type: ignore
+    category: str
+    image_url: str | None = None
+    image: str | None = None
+
+
+class ProductImportError(BaseModel):
+    row: int
+    detail: str
+
+
+class ProductImportResult(BaseModel):
+    inserted: int
+    updated: int
+    inserted_ids: list[int]
+    updated_ids: list[int]
+    errors: list[ProductImportError]
+
+
+class ProductBulkUpdateItem(BaseModel):
+    id: int
+    price: confloat(ge=0) | None = None  # type: ignore
+    original_price: confloat(ge=0) | None = None  # type: ignore
+    discount: float | None = None
+    quantity: conint(ge=0) | None = None  # type: ignore
+
+    @field_validator("price", "quantity")
+    @classmethod
+    def not_null(cls, value):
+        # Поле можно не передавать, но явный null для цены и остатка недопустим
+        if value is None:
+            raise ValueError("значение не может быть null")
+        return value
+
+
+class ProductBulkUpdateResult(BaseModel):
+    updated: list[int]
+    missing: list[int]
+
+
+class CategoryFacet(BaseModel):
+    name: str
+    count: int
+
+
+class PriceFacet(BaseModel):
+    min_price: float
+    max_price: float
+    count: int
+
+
+class RatingFacet(BaseModel):
+    rating: int
+    count: int
+
+
+class ProductFacets(BaseModel):
+    total: int
+    categories: list[CategoryFacet]
+    price: list[PriceFacet]
+    ratings: list[RatingFacet]
+
+
 class OrderItemBase(BaseModel):
     product_id: int
     id: int
@@ -137,6 +232,50 @@ class OrderStatusUpdateResponse(BaseModel):
     status: str
 
 
+class OrderStatusFilter(BaseModel):
+    status: str | None = None
+    user_id: int | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+
+    @model_validator(mode="after")
+    def not_empty(self):
+        # Пустой фильтр выбрал бы все заказы
+        if all(value is None for value in self.model_dump().values()):
+            raise ValueError("нужно указать хотя бы один критерий фильтра")
+        return self
+
+
+class OrderBulkStatusUpdate(BaseModel):
+    status: str
+    ids: list[int] | None = None
+    filter: OrderStatusFilter | None = None
+
+
+class OrderStatusRejection(BaseModel):
+    id: int
+    status: str | None = None
+    detail: str
+
+
+class OrderBulkStatusResult(BaseModel):
+    updated: list[int]
+    rejected: list[OrderStatusRejection]
+    missing: list[int]
+
+
+class SalesByDay(BaseModel):
+    day: date
+    units: int
+    revenue: float
+
+
+class SalesByCategory(BaseModel):
+    category: str
+    units: int
+    revenue: float
+
+
 class ReviewCreate(BaseModel):
     rating: conint(ge=1, le=5)  # type: ignore
 
@@ -149,6 +288,19 @@ class ReviewResponse(BaseModel):
     created_at: datetime
 
 
+class RatingSummary(BaseModel):
+    average_rating: float
+    reviews_count: int
+    histogram: list[RatingFacet]
+
+
+class ProductFull(BaseModel):
+    product: Product
+    rating: RatingSummary
+    reviews: list[ReviewResponse]
+    next_cursor: str | None = None
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -187,6 +339,31 @@ class CartAdd(BaseModel):
     quantity: int
 
 
+class CartSummaryItem(CartItemBase):
+    product_id: int
+    current_price: float
+    available: int
+    price_changed: bool
+    insufficient_stock: bool
+
+
+class CartSummary(BaseModel):
+    items: list[CartSummaryItem]
+    subtotal: float
+    item_count: int
+    can_checkout: bool
+
+
+class CartOperation(BaseModel):
+    op: Literal["add", "set", "remove"]
+    product_id: int
+    quantity: int | None = None
+
+
+class CartBatchUpdate(BaseModel):
+    operations: list[CartOperation]
+
+
 class AdminTempPasswordRequest(BaseModel):
     email: EmailStr
 
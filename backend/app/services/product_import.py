@@ -0,0 +1,309 @@
+import csv
+import io
+import json
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from .. import crud, schemas
+from .supabase_client import upload_image_to_supabase
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_UPLOAD_WORKERS = 8
+ALLOWED_IMAGE_EXTS = {"jpg", "jpeg", "png", "gif", "webp"}
+
+STAGING_COLUMNS = (
+    "row_number",
+    "id",
+    "name",
+    "description",
+    "price",
+    "original_price",
+    "discount",
+    "quantity",
+    "category",
+    "image_url",
+)
+
+
+def read_rows(file, filename: str):
+    """
+    Построчно читает CSV или NDJSON, не загружая файл в память целиком.
+    Возвращает пары (номер строки, словарь значений или текст ошибки разбора)
+    """
+    stream = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if filename.lower().endswith((".ndjson", ".jsonl", ".json")):
+        for row_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_number, f"Некорректный JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield row_number, "Строка должна быть JSON-объектом"
+                continue
+            yield row_number, checked_row(row)
+    else:
+        # Номер строки считаем с учетом заголовка, как в табличных редакторах
+        for row_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield row_number, checked_row(
+                {k: v for k, v in row.items() if v not in ("", None)}
+            )
+
+
+def checked_row(row: dict):
+    # PostgreSQL не хранит нулевой байт в тексте, COPY такой строки прервал бы весь импорт
+    if any(isinstance(value, str) and "\x00" in value for value in row.values()):
+        return "Строка содержит нулевой байт"
+    return row
+
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
+
+
+class ImageUploader:
+    """
+    Загружает изображения из архива в Supabase параллельно, но не более чем в IMPORT_UPLOAD_WORKERS потоков
+    """
+
+    def __init__(self, archive_file):
+        self.archive = zipfile.ZipFile(archive_file) if archive_file else None
+        self._archive_lock = threading.Lock()
+
+    def _upload(self, name: str) -> str:
+        with self._archive_lock:
+            data = self.archive.read(name)  # type: ignore
+        return upload_image_to_supabase(io.BytesIO(data), name)
+
+    def upload_batch(self, rows: list, errors: list) -> list:
+        if not any(row.image for _, row in rows):
+            return rows
+
+        if self.archive is None:
+            for row_number, row in rows:
+                if row.image:
+                    errors.append(
+                        {"row": row_number, "detail": "Архив с изображениями не передан"}
+                    )
+            return [(n, row) for n, row in rows if not row.image]
+
+        names = set(self.archive.namelist())
+        with ThreadPoolExecutor(max_workers=IMPORT_UPLOAD_WORKERS) as executor:
+            futures = {}
+            for row_number, row in rows:
+                if not row.image:
+                    continue
+                ext = row.image.rsplit(".", 1)[-1].lower()
+                if row.image not in names:
+                    errors.append(
+                        {"row": row_number, "detail": f"Файл {row.image} не найден в архиве"}
+                    )
+                elif ext not in ALLOWED_IMAGE_EXTS:
+                    errors.append(
+                        {
+                            "row": row_number,
+                            "detail": f"Недопустимый формат изображения: {row.image}",
+                        }
+                    )
+                else:
+                    futures[row_number] = executor.submit(self._upload, row.image)
+
+            uploaded = []
+            for row_number, row in rows:
+                if not row.image:
+                    uploaded.append((row_number, row))
+                    continue
+                future = futures.get(row_number)
+                if future is None:
+                    continue
+                try:
+                    row.image_url = future.result()
+                except Exception as e:
+                    errors.append(
+                        {
+                            "row": row_number,
+                            "detail": f"Не удалось загрузить изображение: {e}",
+                        }
+                    )
+                    continue
+                uploaded.append((row_number, row))
+        return uploaded
+
+
+def existing_rows(db: Session, rows: list, errors: list) -> list:
+    """
+    Отбрасывает строки с id несуществующих товаров до загрузки их изображений.
+    FOR KEY SHARE не дает удалить найденные товары до конца импорта
+    """
+    ids = [row.id for _, row in rows if row.id is not None]
+    if not ids:
+        return rows
+
+    found = set(
+        db.execute(
+            text("SELECT id FROM products WHERE id = ANY(:ids) FOR KEY SHARE"),
+            {"ids": ids},
+        ).scalars()
+    )
+    kept = []
+    for row_number, row in rows:
+        if row.id is not None and row.id not in found:
+            errors.append({"row": row_number, "detail": f"Товар с id {row.id} не найден"})
+            continue
+        kept.append((row_number, row))
+    return kept
+
+
+def copy_batch(db: Session, rows: list):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row_number, row in rows:
+        writer.writerow(
+            [
+                row_number,
+                row.id,
+                row.name,
+                row.description,
+                row.price,
+                row.original_price,
+                row.discount,
+                row.quantity,
+                row.category,
+                row.image_url,
+            ]
+        )
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY product_import ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def import_products(db: Session, file, filename: str, images_file=None) -> dict:
+    """
+    Загружает каталог через временную таблицу: строки проверяются пачками, копируются COPY,
+    затем одним UPDATE и одним INSERT переносятся в products. Коммит остается за вызывающим кодом
+    """
+    db.execute(
+        text(
+            """
+            CREATE TEMP TABLE product_import (
+                row_number integer NOT NULL,
+                id integer,
+                name text NOT NULL,
+                description text,
+                price double precision NOT NULL,
+                original_price double precision,
+                discount double precision,
+                quantity integer NOT NULL,
+                category text NOT NULL,
+                image_url text
+            ) ON COMMIT DROP
+            """
+        )
+    )
+
+    uploader = ImageUploader(images_file)
+    errors = []
+    seen_ids = set()
+    batch = []
+
+    def flush():
+        rows = uploader.upload_batch(existing_rows(db, batch, errors), errors)
+        if rows:
+            copy_batch(db, rows)
+        batch.clear()
+
+    for row_number, raw in read_rows(file, filename):
+        if isinstance(raw, str):
+            errors.append({"row": row_number, "detail": raw})
+            continue
+        try:
+            row = schemas.ProductImportRow.model_validate(raw)
+        except ValidationError as e:
+            errors.append({"row": row_number, "detail": validation_message(e)})
+            continue
+
+        if row.id is not None:
+            if row.id in seen_ids:
+                errors.append(
+                    {"row": row_number, "detail": f"Товар с id {row.id} повторяется в файле"}
+                )
+                continue
+            seen_ids.add(row.id)
+        elif not row.image_url and not row.image:
+            errors.append(
+                {"row": row_number, "detail": "Для нового товара нужно изображение"}
+            )
+            continue
+
+        batch.append((row_number, row))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+    flush()
+
+    updated_ids = db.execute(
+        text(
+            """
+            UPDATE products p
+            SET name = s.name,
+                description = COALESCE(s.description, p.description),
+                price = s.price,
+                original_price = s.original_price,
+                discount = s.discount,
+                quantity = s.quantity,
+                category = s.category,
+                image_url = COALESCE(s.image_url, p.image_url)
+            FROM product_import s
+            WHERE s.id = p.id
+            RETURNING p.id
+            """
+        )
+    ).scalars().all()
+
+    inserted_ids = db.execute(
+        text(
+            """
+            WITH inserted AS (
+                INSERT INTO products (
+                    name, description, price, original_price, discount,
+                    quantity, category, image_url
+                )
+                SELECT
+                    name, COALESCE(description, ''), price, original_price, discount,
+                    quantity, category, image_url
+                FROM product_import
+                WHERE id IS NULL
+                ORDER BY row_number
+                RETURNING id
+            )
+            INSERT INTO product_ratings (product_id)
+            SELECT id FROM inserted
+            RETURNING product_id
+            """
+        )
+    ).scalars().all()
+
+    if inserted_ids or updated_ids:
+        crud.recount_categories(db)
+
+    errors.sort(key=lambda error: error["row"])
+    return {
+        "inserted": len(inserted_ids),
+        "updated": len(updated_ids),
+        "inserted_ids": inserted_ids,
+        "updated_ids": updated_ids,
+        "errors": errors,
+    }
@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from . import database
+
+STREAM_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def iter_rows(statement, batch_size: int = STREAM_BATCH_SIZE):
+    """
+    Читает результат серверным курсором пачками по batch_size строк.
+    Сессия открывается внутри генератора: сессия из get_db закрывается до отправки тела ответа
+    """
+    db = database.SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(yield_per=batch_size))
+        for partition in result.mappings().partitions():
+            yield partition
+    finally:
+        db.close()
+
+
+def ndjson_lines(statement):
+    for partition in iter_rows(statement):
+        yield "".join(
+            json.dumps(jsonable_encoder(row), ensure_ascii=False) + "\n"
+            for row in partition
+        )
+
+
+def ndjson_response(statement) -> StreamingResponse:
+    return StreamingResponse(ndjson_lines(statement), media_type="application/x-ndjson")
+
+
+def csv_chunks(statement):
+    """
+    CSV с BOM, чтобы Excel открывал кириллицу без выбора кодировки. Заголовок берется
+    из колонок запроса, поэтому пустой результат тоже дает файл с заголовком
+    """
+    columns = list(statement.selected_columns.keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    for partition in iter_rows(statement):
+        writer.writerows([row[column] for column in columns] for row in partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Файл, в который пишет ParquetWriter: накопленные байты забираются после каждой группы строк
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def arrow_schema(statement):
+    import pyarrow as pa
+
+    types = {
+        bool: pa.bool_(),
+        int: pa.int64(),
+        float: pa.float64(),
+        str: pa.string(),
+        datetime: pa.timestamp("us", tz="UTC"),
+        date: pa.date32(),
+    }
+    fields = []
+    for column in statement.selected_columns:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = str
+        fields.append(pa.field(column.key, types.get(python_type, pa.string())))
+    return pa.schema(fields)
+
+
+def parquet_chunks(statement):
+    """
+    Каждая пачка строк записывается отдельной группой строк Parquet и сразу отдается клиенту
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Экспорт в Parquet недоступен: не установлен pyarrow",
+        )
+
+    schema = arrow_schema(statement)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+
+    def generate():
+        try:
+            for partition in iter_rows(statement):
+                writer.write_table(
+                    pa.Table.from_pylist([dict(row) for row in partition], schema=schema)
+                )
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    return generate()
+
+
+def export_response(statement, export_format: str, filename: str) -> StreamingResponse:
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Недопустимый формат выгрузки. Разрешены: {', '.join(EXPORT_FORMATS)}",
+        )
+
+    media_type, extension = EXPORT_FORMATS[export_format]
+    if export_format == "csv":
+        chunks = csv_chunks(statement)
+    elif export_format == "parquet":
+        chunks = parquet_chunks(statement)
+    else:
+        chunks = ndjson_lines(statement)
+
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'},
+    )
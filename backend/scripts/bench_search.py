@@ -0,0 +1,193 @@
+"""
+Замер задержки поиска по каталогу на большом числе товаров:
+
+    python -m scripts.bench_search --seed 1000000   # добавить синтетические товары (категории bench-*)
+    python -m scripts.bench_search                  # замерить режимы поиска
+    python -m scripts.bench_search --seqscan        # то же с отключенными индексами, для сравнения
+    python -m scripts.bench_search --cleanup        # удалить синтетические товары
+
+Запросы строятся теми же функциями, что и GET /products/, поэтому замер отражает план эндпоинта
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from sqlalchemy import func, select, text
+from app import crud, database, models
+from app.routers.products import keyset_order, product_filters, search_rank
+
+BENCH_CATEGORY_PREFIX = "bench-"
+SEARCH_TERMS = {
+    "substring": ["смартфон", "Xiaomi", "4521"],
+    "fulltext": ["смартфон", "беспроводные наушники", "чайник Bosch"],
+    "fuzzy": ["смартфн", "наушники Sonny", "кофеварк"],
+}
+PAGE_SIZE = 14
+
+SEED_SQL = """
+INSERT INTO products (name, description, price, quantity, category, image_url)
+SELECT
+    w.kinds[1 + g % 10] || ' ' || w.brands[1 + (g / 10) % 8] || ' ' || (g % 9973),
+    'Описание: ' || w.traits[1 + g % 7] || ', ' || w.traits[1 + (g / 7) % 7]
+        || ', для дома и офиса',
+    1 + (g % 100000) / 100.0,
+    g % 50,
+    :prefix || w.kinds[1 + g % 10],
+    'http://img'
+FROM generate_series(1, :rows) AS g,
+    (
+        SELECT
+            ARRAY['смартфон', 'ноутбук', 'наушники', 'чайник', 'кофеварка',
+                  'телевизор', 'планшет', 'часы', 'монитор', 'клавиатура'] AS kinds,
+            ARRAY['Apple', 'Samsung', 'Xiaomi', 'Bosch', 'Philips', 'Sony',
+                  'LG', 'Lenovo'] AS brands,
+            ARRAY['беспроводные', 'компактный', 'мощный', 'тихий', 'легкий',
+                  'водонепроницаемый', 'энергосберегающий'] AS traits
+    ) AS w
+"""
+
+# Каталог рассчитывает на строку product_ratings у каждого товара, как после create_product и импорта
+SEED_RATINGS_SQL = """
+INSERT INTO product_ratings (product_id, reviews_count, average_rating)
+SELECT p.id, p.id % 50, CASE WHEN p.id % 50 = 0 THEN 0 ELSE 1 + (p.id % 41) / 10.0 END
+FROM products p
+WHERE p.category LIKE :prefix || '%'
+ON CONFLICT (product_id) DO NOTHING
+"""
+
+
+def bench_categories(db) -> list[str]:
+    return list(
+        db.execute(
+            select(models.Product.category)
+            .where(models.Product.category.startswith(BENCH_CATEGORY_PREFIX))
+            .distinct()
+        ).scalars()
+    )
+
+
+def seed(db, rows: int):
+    started = time.perf_counter()
+    db.execute(text(SEED_SQL), {"rows": rows, "prefix": BENCH_CATEGORY_PREFIX})
+    db.execute(text(SEED_RATINGS_SQL), {"prefix": BENCH_CATEGORY_PREFIX})
+    crud.recount_categories(db, bench_categories(db))
+    db.commit()
+    db.execute(text("ANALYZE products"))
+    db.execute(text("ANALYZE product_ratings"))
+    db.commit()
+    print(f"Добавлено товаров: {rows} за {time.perf_counter() - started:.1f} с")
+
+
+def cleanup(db):
+    categories = bench_categories(db)
+    deleted = db.execute(
+        models.Product.__table__.delete().where(
+            models.Product.category.startswith(BENCH_CATEGORY_PREFIX)
+        )
+    ).rowcount
+    crud.recount_categories(db, categories)
+    db.commit()
+    print(f"Удалено товаров: {deleted}")
+
+
+def search_query(term: str, mode: str, relevance: bool):
+    """
+    Первая страница GET /products/?search=...&search_mode=...&in_stock=false,
+    с sort_by=relevance или в порядке по умолчанию (по id)
+    """
+    if relevance:
+        sort_column, descending = search_rank(term, mode), True
+    else:
+        sort_column, descending = models.Product.id, False
+    return (
+        select(models.Product.id, sort_column.label("sort_value"))
+        .outerjoin(
+            models.ProductRating, models.Product.id == models.ProductRating.product_id
+        )
+        .where(*product_filters(term, mode, None, None, None, None))
+        .order_by(*keyset_order(sort_column, models.Product.id, descending))
+        .limit(PAGE_SIZE + 1)
+    )
+
+
+def needs_trigram(mode: str, relevance: bool) -> bool:
+    # fuzzy и ранжирование substring используют word_similarity из pg_trgm
+    return mode == "fuzzy" or (mode == "substring" and relevance)
+
+
+def plan_access(db, statement) -> str:
+    compiled = statement.compile(
+        dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True}
+    )
+    plan = db.connection().exec_driver_sql(f"EXPLAIN {compiled}", compiled.params)
+    for (line,) in plan:
+        if "Scan" in line:
+            return line.strip().lstrip("-> ").split("  (")[0]
+    return "?"
+
+
+def run(db, repeat: int):
+    total = db.execute(select(func.count()).select_from(models.Product)).scalar_one()
+    has_trigram = db.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+    ).scalar_one()
+    print(f"Товаров в каталоге: {total}, повторов на запрос: {repeat}")
+    print(
+        f"{'режим':<10} {'запрос':<22} {'порядок':<10} "
+        f"{'p50, мс':>9} {'p95, мс':>9} {'max, мс':>9}  план"
+    )
+    for mode, terms in SEARCH_TERMS.items():
+        for term in terms:
+            for relevance in (False, True):
+                order = "relevance" if relevance else "id"
+                if needs_trigram(mode, relevance) and not has_trigram:
+                    print(f"{mode:<10} {term:<22} {order:<10} пропущено: не установлен pg_trgm")
+                    continue
+
+                statement = search_query(term, mode, relevance)
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    db.execute(statement).all()
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                print(
+                    f"{mode:<10} {term:<22} {order:<10} {statistics.median(timings):>9.1f} "
+                    f"{p95:>9.1f} {timings[-1]:>9.1f}  {plan_access(db, statement)}"
+                )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Замер задержки поиска по каталогу")
+    parser.add_argument("--seed", type=int, default=None, help="добавить N синтетических товаров")
+    parser.add_argument("--cleanup", action="store_true", help="удалить синтетические товары")
+    parser.add_argument("--repeat", type=int, default=20, help="повторов каждого запроса")
+    parser.add_argument(
+        "--seqscan",
+        action="store_true",
+        help="запретить индексные планы, чтобы сравнить с полным чтением таблицы",
+    )
+    args = parser.parse_args(argv)
+
+    db = database.SessionLocal()
+    try:
+        if args.cleanup:
+            cleanup(db)
+            return 0
+        if args.seed:
+            seed(db, args.seed)
+
+        if args.seqscan:
+            db.execute(text("SET enable_indexscan = off"))
+            db.execute(text("SET enable_bitmapscan = off"))
+        run(db, args.repeat)
+    finally:
+        db.rollback()
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,21 @@
+from app import cache
+
+
+def test_catalog_etag_expires_with_cache_ttl(monkeypatch):
+    now = 1_000_000 * cache.settings.cache_ttl_seconds
+    monkeypatch.setattr(cache.time, "time", lambda: now)
+    etag = cache.catalog_etag("categories")
+
+    now += cache.settings.cache_ttl_seconds / 2
+    assert cache.catalog_etag("categories") == etag
+
+    now += cache.settings.cache_ttl_seconds
+    assert cache.catalog_etag("categories") != etag
+
+
+def test_catalog_etag_changes_on_invalidation():
+    etag = cache.catalog_etag("product", 1)
+
+    cache.invalidate_reviews(1)
+
+    assert cache.catalog_etag("product", 1) != etag
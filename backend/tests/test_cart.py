@@ -0,0 +1,73 @@
+def add(client, product_id: int, quantity: int):
+    return client.post("/products/cart", json={"product_id": product_id, "quantity": quantity})
+
+
+def patch(client, *operations: dict):
+    return client.patch("/cart/", json={"operations": list(operations)})
+
+
+def cart_quantities(client) -> list[int]:
+    return [item["quantity"] for item in client.get("/cart/").json()]
+
+
+def test_unknown_cart_operation_is_rejected(client, factory, login):
+    product_id = factory.product()
+    login(factory.user())
+
+    response = patch(client, {"op": "double", "product_id": product_id, "quantity": 1})
+
+    assert response.status_code == 422
+
+
+def test_add_to_cart_checks_resulting_quantity(client, factory, login):
+    product_id = factory.product(quantity=3)
+    login(factory.user())
+
+    assert add(client, product_id, 2).status_code == 201
+    assert add(client, product_id, 2).status_code == 400
+    assert cart_quantities(client) == [2]
+    assert add(client, product_id, 1).status_code == 201
+    assert cart_quantities(client) == [3]
+
+
+def test_add_and_patch_apply_the_same_stock_rule(client, factory, login):
+    product_id = factory.product(quantity=3)
+    login(factory.user())
+    assert add(client, product_id, 2).status_code == 201
+
+    response = patch(client, {"op": "add", "product_id": product_id, "quantity": 2})
+
+    assert response.status_code == 400
+    assert cart_quantities(client) == [2]
+    response = patch(client, {"op": "add", "product_id": product_id, "quantity": 1})
+    assert response.status_code == 200
+    assert cart_quantities(client) == [3]
+
+
+def test_product_without_stock_cannot_be_added(client, factory, login):
+    product_id = factory.product(quantity=None)
+    login(factory.user())
+
+    assert add(client, product_id, 1).status_code == 400
+    response = patch(client, {"op": "set", "product_id": product_id, "quantity": 1})
+    assert response.status_code == 400
+    assert cart_quantities(client) == []
+
+
+def test_summary_treats_missing_stock_as_zero(client, factory, login):
+    in_stock = factory.product(quantity=5)
+    no_stock = factory.product(quantity=None)
+    user = factory.user()
+    factory.cart(user, {in_stock: 1, no_stock: 1})
+    login(user)
+
+    response = client.get("/cart/summary")
+
+    assert response.status_code == 200
+    summary = response.json()
+    lines = {item["product_id"]: item for item in summary["items"]}
+    assert lines[in_stock]["available"] == 5
+    assert not lines[in_stock]["insufficient_stock"]
+    assert lines[no_stock]["available"] == 0
+    assert lines[no_stock]["insufficient_stock"]
+    assert not summary["can_checkout"]
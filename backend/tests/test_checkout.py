@@ -0,0 +1,73 @@
+import threading
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from app import database, models, schemas
+from app.routers.orders import create_order
+
+ORDER = schemas.OrderCreate(address="Адрес", phone="+70000000000")
+
+
+def checkout(user: schemas.User):
+    db = database.SessionLocal()
+    try:
+        return create_order(ORDER, db, user, None)
+    finally:
+        db.close()
+
+
+def test_concurrent_checkouts_do_not_oversell(db, factory):
+    buyers, stock = 12, 4
+    product_id = factory.product(quantity=stock)
+    users = [factory.user() for _ in range(buyers)]
+    for user in users:
+        factory.cart(user, {product_id: 1})
+
+    barrier = threading.Barrier(buyers)
+    results = []
+
+    def run(user):
+        barrier.wait()
+        try:
+            checkout(user)
+            results.append("ok")
+        except HTTPException as e:
+            results.append(e.status_code)
+
+    threads = [threading.Thread(target=run, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count("ok") == stock
+    assert results.count(400) == buyers - stock
+    assert db.get(models.Product, product_id).quantity == 0
+    orders = db.execute(
+        select(func.count())
+        .select_from(models.OrderItem)
+        .where(models.OrderItem.product_id == product_id)
+    ).scalar_one()
+    assert orders == stock
+
+
+def test_failed_checkout_rolls_back_earlier_decrements(db, factory):
+    enough = factory.product(quantity=5)
+    short = factory.product(quantity=1)
+    user = factory.user()
+    cart_id = factory.cart(user, {enough: 2, short: 3})
+
+    with pytest.raises(HTTPException) as error:
+        checkout(user)
+
+    assert error.value.status_code == 400
+    assert db.get(models.Product, enough).quantity == 5
+    assert db.get(models.Product, short).quantity == 1
+    assert db.execute(
+        select(func.count()).select_from(models.Order).where(models.Order.user_id == user.id)
+    ).scalar_one() == 0
+    assert db.execute(
+        select(func.count())
+        .select_from(models.CartItem)
+        .where(models.CartItem.cart_id == cart_id)
+    ).scalar_one() == 2
@@ -0,0 +1,70 @@
+import io
+import zipfile
+from app.services import product_import
+
+MISSING_ID = 2_000_000_000
+
+
+def images_zip(*names: str) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name in names:
+            archive.writestr(name, b"image")
+    return buffer.getvalue()
+
+
+def import_csv(client, content: str, images: bytes | None = None):
+    files = {"file": ("products.csv", content.encode(), "text/csv")}
+    if images is not None:
+        files["images"] = ("images.zip", images, "application/zip")
+    return client.post("/products/import", files=files)
+
+
+def test_missing_product_is_rejected_before_image_upload(
+    client, factory, login, monkeypatch
+):
+    uploads = []
+    monkeypatch.setattr(
+        product_import,
+        "upload_image_to_supabase",
+        lambda file, name: uploads.append(name) or f"http://img/{name}",
+    )
+    product_id = factory.product()
+    login(factory.user(role="admin"))
+    category = f"test-{factory.tag}"
+
+    response = import_csv(
+        client,
+        "id,name,price,quantity,category,image\n"
+        f"{product_id},Товар,5,1,{category},found.png\n"
+        f"{MISSING_ID},Товар,5,1,{category},missing.png\n",
+        images_zip("found.png", "missing.png"),
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["updated_ids"] == [product_id]
+    assert result["errors"] == [{"row": 3, "detail": f"Товар с id {MISSING_ID} не найден"}]
+    assert uploads == ["found.png"]
+
+
+def test_oversized_csv_field_is_bad_request(client, factory, login):
+    login(factory.user(role="admin"))
+
+    response = import_csv(client, "name,description\nТовар," + "x" * 200_000 + "\n")
+
+    assert response.status_code == 400
+
+
+def test_nul_byte_is_reported_as_row_error(client, factory, login):
+    product_id = factory.product()
+    login(factory.user(role="admin"))
+
+    response = import_csv(
+        client,
+        "id,name,price,quantity,category\n"
+        f"{product_id},Тов\x00ар,5,1,test-{factory.tag}\n",
+    )
+
+    assert response.status_code == 200
+    assert response.json()["errors"] == [{"row": 2, "detail": "Строка содержит нулевой байт"}]
@@ -0,0 +1,137 @@
+from sqlalchemy import select, update
+from app import crud, database, models, schemas
+from app.routers import orders
+from app.routers.orders import create_order
+
+
+def place_order(user: schemas.User) -> int:
+    db = database.SessionLocal()
+    try:
+        order = schemas.OrderCreate(address="Адрес", phone="+70000000000")
+        return create_order(order, db, user, None)["id"]
+    finally:
+        db.close()
+
+
+def sales_by_category(db, product_id: int) -> dict[str, int]:
+    rows = db.execute(
+        select(models.SalesDaily.category, models.SalesDaily.units).where(
+            models.SalesDaily.product_id == product_id
+        )
+    )
+    return {category: units for category, units in rows}
+
+
+def test_cancel_after_category_change_subtracts_original_category(
+    db, factory, client, login
+):
+    product_id = factory.product(quantity=5)
+    original = f"test-{factory.tag}"
+    moved = f"{original}-moved"
+    factory.categories.add(moved)
+
+    buyer = factory.user()
+    factory.cart(buyer, {product_id: 2})
+    order_id = place_order(buyer)
+    assert sales_by_category(db, product_id) == {original: 2}
+
+    db.execute(
+        update(models.Product)
+        .where(models.Product.id == product_id)
+        .values(category=moved)
+    )
+    crud.recount_categories(db, [original, moved])
+    db.commit()
+
+    login(factory.user("admin"))
+    response = client.put(f"/orders/{order_id}", json={"status": crud.ORDER_CANCELLED})
+
+    assert response.status_code == 200
+    db.expire_all()
+    assert sales_by_category(db, product_id) == {original: 0}
+
+
+def test_bulk_status_rejects_empty_filter(client, factory, login):
+    login(factory.user("admin"))
+
+    response = client.patch("/orders/status", json={"status": "отправлен", "filter": {}})
+
+    assert response.status_code == 422
+
+
+def test_bulk_status_filter_is_capped(db, client, factory, login, monkeypatch):
+    monkeypatch.setattr(orders, "MAX_BULK_STATUS_ORDERS", 2)
+    buyer = factory.user()
+    for _ in range(3):
+        db.add(models.Order(user_id=buyer.id, total_price=0, address="Адрес", phone="1"))
+    db.commit()
+    login(factory.user("admin"))
+
+    response = client.patch(
+        "/orders/status", json={"status": "отправлен", "filter": {"user_id": buyer.id}}
+    )
+
+    assert response.status_code == 400
+    statuses = db.execute(
+        select(models.Order.status).where(models.Order.user_id == buyer.id)
+    ).scalars()
+    assert set(statuses) == {"в обработке"}
+
+
+def add_orders(db, user: schemas.User, count: int):
+    db.execute(
+        models.Order.__table__.insert(),
+        [
+            {"user_id": user.id, "total_price": 0, "address": "Адрес", "phone": "1"}
+            for _ in range(count)
+        ],
+    )
+    db.commit()
+
+
+def test_admin_order_list_is_paged_by_default(db, client, factory, login):
+    add_orders(db, factory.user(), orders.DEFAULT_ORDERS_PAGE_SIZE + 1)
+    login(factory.user("admin"))
+
+    response = client.get("/orders/")
+
+    assert response.status_code == 200
+    assert len(response.json()) == orders.DEFAULT_ORDERS_PAGE_SIZE
+    assert "X-Next-Cursor" in response.headers
+
+
+def test_my_orders_are_paged_by_default(db, client, factory, login):
+    buyer = factory.user()
+    add_orders(db, buyer, orders.DEFAULT_ORDERS_PAGE_SIZE + 1)
+    login(buyer)
+
+    response = client.get("/orders/my_orders")
+    assert response.status_code == 200
+    first_page = [order["id"] for order in response.json()]
+    assert len(first_page) == orders.DEFAULT_ORDERS_PAGE_SIZE
+
+    response = client.get(
+        "/orders/my_orders", params={"cursor": response.headers["X-Next-Cursor"]}
+    )
+    assert len(response.json()) == 1
+    assert "X-Next-Cursor" not in response.headers
+    assert response.json()[0]["id"] not in first_page
+
+
+def test_single_status_update_follows_allowed_transitions(db, client, factory, login):
+    order = models.Order(
+        user_id=factory.user().id, total_price=0, address="Адрес", phone="1"
+    )
+    db.add(order)
+    db.commit()
+    login(factory.user("admin"))
+
+    def put(new_status):
+        return client.put(f"/orders/{order.id}", json={"status": new_status})
+
+    assert put("доставлен").status_code == 400
+    assert put(crud.ORDER_CANCELLED).status_code == 200
+    assert put(crud.ORDER_CANCELLED).status_code == 200
+    assert put("в обработке").status_code == 400
+    db.refresh(order)
+    assert order.status == crud.ORDER_CANCELLED
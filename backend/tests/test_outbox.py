@@ -0,0 +1,132 @@
+import uuid
+import pytest
+from sqlalchemy import delete, func, select, text, update
+from app import database, models, outbox
+from app.config import settings
+
+
+@pytest.fixture
+def event_type(engine):
+    event_type = f"test.{uuid.uuid4().hex[:8]}"
+    yield event_type
+    outbox._handlers.pop(event_type, None)
+    db = database.SessionLocal()
+    db.execute(delete(models.OutboxEvent).where(models.OutboxEvent.event_type == event_type))
+    db.commit()
+    db.close()
+
+
+def enqueue(db, event_type: str, count: int = 1) -> list[int]:
+    for number in range(count):
+        outbox.enqueue(db, event_type, {"number": number})
+    db.commit()
+    return list(
+        db.execute(
+            select(models.OutboxEvent.id)
+            .where(models.OutboxEvent.event_type == event_type)
+            .order_by(models.OutboxEvent.id)
+        ).scalars()
+    )
+
+
+def load_event(db, event_id: int) -> models.OutboxEvent:
+    db.expire_all()
+    return db.get(models.OutboxEvent, event_id)  # type: ignore
+
+
+def test_delivered_event_is_not_processed_again(db, event_type):
+    calls = []
+    outbox.handler(event_type)(lambda db, event: calls.append(event.payload["number"]))
+    [event_id] = enqueue(db, event_type)
+
+    outbox.process_batch(db, 100)
+    outbox.process_batch(db, 100)
+
+    event = load_event(db, event_id)
+    assert calls == [0]
+    assert event.processed_at is not None
+    assert event.last_error is None
+    assert event.attempts == 0
+
+
+def test_failed_event_is_postponed_with_backoff(db, event_type):
+    calls = []
+
+    @outbox.handler(event_type)
+    def fail(db, event):
+        calls.append(event.id)
+        raise ValueError("нет связи")
+
+    [event_id] = enqueue(db, event_type)
+
+    outbox.process_batch(db, 100)
+    event = load_event(db, event_id)
+    assert event.processed_at is None
+    assert event.attempts == 1
+    assert event.last_error == "ValueError: нет связи"
+    delay = db.execute(select(event.available_at - func.now())).scalar_one()
+    assert delay.total_seconds() > outbox.retry_delay(1).total_seconds() - 1
+
+    # До истечения задержки событие не выбирается
+    outbox.process_batch(db, 100)
+    assert calls == [event_id]
+    assert load_event(db, event_id).attempts == 1
+
+
+def test_event_stops_after_max_attempts(db, event_type):
+    calls = []
+
+    @outbox.handler(event_type)
+    def fail(db, event):
+        calls.append(event.id)
+        raise ValueError("нет связи")
+
+    [event_id] = enqueue(db, event_type)
+    db.execute(
+        update(models.OutboxEvent)
+        .where(models.OutboxEvent.id == event_id)
+        .values(attempts=settings.outbox_max_attempts - 1)
+    )
+    db.commit()
+
+    outbox.process_batch(db, 100)
+    db.execute(
+        update(models.OutboxEvent)
+        .where(models.OutboxEvent.id == event_id)
+        .values(available_at=func.now())
+    )
+    db.commit()
+    outbox.process_batch(db, 100)
+
+    event = load_event(db, event_id)
+    assert calls == [event_id]
+    assert event.attempts == settings.outbox_max_attempts
+    assert event.processed_at is None
+
+
+def test_locked_event_is_skipped(db, event_type):
+    calls = []
+    outbox.handler(event_type)(lambda db, event: calls.append(event.id))
+    locked_id, free_id = enqueue(db, event_type, 2)
+
+    other = database.SessionLocal()
+    try:
+        # Первое событие держит другой воркер
+        other.execute(
+            select(models.OutboxEvent.id)
+            .where(models.OutboxEvent.id == locked_id)
+            .with_for_update()
+        ).one()
+        # Без SKIP LOCKED выборка ждала бы блокировку и упала бы по таймауту
+        db.execute(text("SET LOCAL lock_timeout = '2s'"))
+        outbox.process_batch(db, 100)
+
+        assert calls == [free_id]
+        assert load_event(db, locked_id).processed_at is None
+        assert load_event(db, free_id).processed_at is not None
+    finally:
+        other.rollback()
+        other.close()
+
+    outbox.process_batch(db, 100)
+    assert calls == [free_id, locked_id]
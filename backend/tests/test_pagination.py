@@ -0,0 +1,28 @@
+from sqlalchemy import select
+from app import models
+from app.pagination import estimated_count
+
+
+def test_estimated_count_expands_in_list(db, factory):
+    categories = [f"{factory.tag}-a", f"{factory.tag}-b"]
+    for category in categories:
+        factory.product(category=category)
+
+    statement = select(models.Product.id).where(models.Product.category.in_(categories))
+
+    assert estimated_count(db, statement) >= 1
+
+
+def test_products_estimated_total_with_several_categories(client, factory):
+    categories = [f"{factory.tag}-a", f"{factory.tag}-b"]
+    for category in categories:
+        factory.product(category=category)
+
+    response = client.get(
+        "/products/",
+        params={"total": "estimated", "categories": categories, "in_stock": False},
+    )
+
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert int(response.headers["X-Total-Count"]) >= 1
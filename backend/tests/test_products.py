@@ -0,0 +1,128 @@
+import threading
+import time
+from sqlalchemy import select, update
+from app import crud, database, models
+from app.cache import invalidate_products
+from app.routers import products
+
+
+def test_bulk_update_rejects_explicit_null(client, factory, login):
+    login(factory.user(role="admin"))
+    product_id = factory.product(price=10.0, quantity=5)
+
+    for field in ("price", "quantity"):
+        response = client.patch("/products/bulk", json=[{"id": product_id, field: None}])
+        assert response.status_code == 422
+
+
+def test_bulk_update_changes_only_passed_fields(client, db, factory, login):
+    login(factory.user(role="admin"))
+    product_id = factory.product(price=10.0, quantity=5)
+
+    response = client.patch(
+        "/products/bulk", json=[{"id": product_id, "quantity": 7, "discount": None}]
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"updated": [product_id], "missing": []}
+    product = db.get(models.Product, product_id)
+    assert (product.price, product.quantity, product.discount) == (10.0, 7, None)
+
+
+def test_rating_sort_pages_through_every_product(client, db, factory):
+    ratings = [(4.5, 2), (4.5, 3), (0.0, 0), (3.0, 1)]
+    product_ids = [factory.product() for _ in ratings]
+    for product_id, (average, count) in zip(product_ids, ratings):
+        db.execute(
+            update(models.ProductRating)
+            .where(models.ProductRating.product_id == product_id)
+            .values(average_rating=average, reviews_count=count)
+        )
+    db.commit()
+    invalidate_products(*product_ids)
+
+    params = {
+        "sort_by": "average_rating",
+        "categories": [f"test-{factory.tag}"],
+        "in_stock": False,
+        "limit": 1,
+    }
+    seen = []
+    while True:
+        response = client.get("/products/", params=params)
+        assert response.status_code == 200
+        seen += [product["id"] for product in response.json()]
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+    expected = sorted(
+        product_ids,
+        key=lambda product_id: (ratings[product_ids.index(product_id)][0], product_id),
+        reverse=True,
+    )
+    assert seen == expected
+
+
+def test_admin_product_list_is_paged_by_default(client, factory, login):
+    for _ in range(products.ADMIN_PAGE_SIZE + 1):
+        factory.product()
+    login(factory.user(role="admin"))
+
+    response = client.get("/products/admin", params={"categories": [f"test-{factory.tag}"]})
+
+    assert response.status_code == 200
+    assert len(response.json()) == products.ADMIN_PAGE_SIZE
+    assert "X-Next-Cursor" in response.headers
+
+
+def stored_counts(db, categories) -> dict:
+    rows = db.execute(
+        select(
+            models.CategoryCount.category,
+            models.CategoryCount.total,
+            models.CategoryCount.in_stock,
+        ).where(models.CategoryCount.category.in_(categories))
+    )
+    return {
+        row.category: (row.total, row.in_stock)
+        for row in rows
+        if (row.total, row.in_stock) != (0, 0)
+    }
+
+
+def test_update_waits_for_concurrent_stock_change(client, db, factory, login):
+    product_id = factory.product(quantity=5)
+    category = f"test-{factory.tag}"
+    login(factory.user(role="admin"))
+
+    # Параллельная транзакция, как при оформлении заказа, списывает весь остаток
+    checkout = database.SessionLocal()
+    checkout.execute(
+        update(models.Product).where(models.Product.id == product_id).values(quantity=0)
+    )
+    crud.adjust_category_counts(checkout, before=[(category, 5)], after=[(category, 0)])
+
+    responses = []
+    form = {
+        "name": "Товар",
+        "description": "",
+        "price": "10",
+        "quantity": "3",
+        "category": category,
+    }
+    request = threading.Thread(
+        target=lambda: responses.append(client.put(f"/products/{product_id}", data=form))
+    )
+    request.start()
+    time.sleep(0.3)
+    checkout.commit()
+    checkout.close()
+    request.join()
+
+    assert responses[0].status_code == 200
+    actual = {
+        row.category: (row.total, row.in_stock)
+        for row in db.execute(crud.category_counts_query([category]))
+    }
+    assert stored_counts(db, [category]) == actual == {category: (1, 1)}
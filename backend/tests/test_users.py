@@ -0,0 +1,37 @@
+def product_rating(client, factory, product_id: int) -> tuple[float, int]:
+    response = client.get(
+        "/products/", params={"categories": [f"test-{factory.tag}"], "in_stock": False}
+    )
+    [product] = [item for item in response.json() if item["id"] == product_id]
+    return product["average_rating"], product["reviews_count"]
+
+
+def test_deleting_user_refreshes_cached_ratings(client, factory, login):
+    product_id = factory.product()
+    leaving, staying = factory.user(), factory.user()
+    for user, rating in ((leaving, 1), (staying, 5)):
+        login(user)
+        response = client.post(f"/products/{product_id}/review", json={"rating": rating})
+        assert response.status_code == 201
+
+    assert product_rating(client, factory, product_id) == (3.0, 2)
+    assert len(client.get(f"/products/{product_id}/reviews").json()) == 2
+
+    login(leaving)
+    assert client.delete("/users/me").status_code == 204
+
+    assert product_rating(client, factory, product_id) == (5.0, 1)
+    assert len(client.get(f"/products/{product_id}/reviews").json()) == 1
+
+
+def test_deleting_user_changes_catalog_etag(client, factory, login):
+    product_id = factory.product()
+    user = factory.user()
+    login(user)
+    assert client.post(f"/products/{product_id}/review", json={"rating": 4}).status_code == 201
+    etag = client.get("/products/").headers["ETag"]
+
+    assert client.delete("/users/me").status_code == 204
+
+    response = client.get("/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 200